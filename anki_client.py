@@ -1,14 +1,308 @@
+from __future__ import annotations
+
+import io
 import json
-import urllib.request
+import os
+import queue
+import threading
+import time
 import urllib.parse
-from typing import List, Dict, Any, Optional
-from anki_schema import AnkiCard, LearningContent
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Iterable, Optional, Sequence, Tuple, Union
+from anki_schema import AnkiCard, LearningContent, add_notes_request_length, iter_add_notes_request
+from client_metrics import ClientMetrics
+
+if TYPE_CHECKING:
+    # 起動を速くするため、http.clientなどは最初に使うときに読み込む
+    import http.client
+    from card_batch import CardBatch
+    from duplicate_index import DuplicateIndex
+    from note_id_map import NoteIdMap
+
+DEFAULT_BASE_URL = "http://localhost:8765"
+
+
+def _read_response(response: http.client.HTTPResponse) -> Tuple[Dict[str, Any], int]:
+    """レスポンス全体を読み込んでデコード（戻り値は (JSON, 受信バイト数)）"""
+    payload = response.read()
+    return json.loads(payload.decode('utf-8')), len(payload)
+
+
+def _read_response_incrementally(response: http.client.HTTPResponse) -> Tuple[Dict[str, Any], int]:
+    """レスポンスのresult配列を要素ごとに読み込む（レスポンス全体の文字列を作らない）"""
+    from json_stream import iter_json_array_member
+    
+    members: Dict[str, Any] = {}
+    text = io.TextIOWrapper(response, encoding='utf-8')
+    try:
+        result = list(iter_json_array_member(text, "result", members))
+    finally:
+        # TextIOWrapperが破棄されたときにレスポンスを閉じないように切り離す
+        text.detach()
+    members.setdefault("result", result)
+    return members, int(response.getheader("Content-Length") or 0)
+
+
+class _ConnectionPool:
+    """HTTP/1.1 keep-aliveコネクションを使い回すスレッドセーフなプール"""
+
+    def __init__(self, base_url: str, size: int = 4, timeout: Optional[float] = None):
+        if size < 1:
+            raise ValueError("pool_size は1以上を指定してください")
+
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme or "http"
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port
+        self.path = parsed.path or "/"
+        self.size = size
+        self.timeout = timeout
+
+        # 同時に貸し出せる数をsizeに制限し、空きコネクションはLIFOで再利用
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=size)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        """新しいコネクションを生成（接続は最初のリクエスト時に確立される）"""
+        import http.client
+        
+        # timeoutがNoneの場合はurlopenと同じくソケットの既定値（通常は無制限）で待つ
+        options = {} if self.timeout is None else {"timeout": self.timeout}
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, **options)
+        return http.client.HTTPConnection(self.host, self.port, **options)
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """コネクションを借りる（戻り値の2番目は再利用かどうか）"""
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def _release(self, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        """コネクションをプールに返却"""
+        try:
+            if reusable:
+                self._idle.put_nowait(conn)
+            else:
+                conn.close()
+        finally:
+            self._slots.release()
+
+    def post(self, body: Union[bytes, Callable[[], Iterable[bytes]]], headers: Dict[str, str],
+             read: Optional[Callable[[http.client.HTTPResponse], Any]] = None) -> Any:
+        """
+        POSTリクエストを送信してレスポンスを返す
+        bodyにはバイト列か、本文をチャンクごとに返すイテラブルを作る関数を渡す
+        （関数の場合はContent-Lengthをheadersに含めること。再接続時にもう一度呼ばれる）
+        readを渡すとレスポンス本文の代わりにread(response)の戻り値を返す
+        """
+        conn, reused = self._acquire()
+        reusable = False
+        try:
+            try:
+                response = self._round_trip(conn, body, headers)
+            except (ConnectionResetError, BrokenPipeError):
+                # 待機中にサーバー側で切断されたkeep-aliveコネクションは一度だけ張り直す
+                # （http.client.RemoteDisconnectedはConnectionResetErrorのサブクラス）
+                if not reused:
+                    raise
+                conn.close()
+                conn = self._new_connection()
+                response = self._round_trip(conn, body, headers)
+
+            if response.status != 200:
+                response.read()
+                reusable = not response.will_close
+                raise Exception(f"HTTP Error {response.status}: {response.reason}")
+
+            payload = response.read() if read is None else read(response)
+            # 読み残しがあればコネクションを再利用できるように読み捨てる
+            response.read()
+            reusable = not response.will_close
+            return payload
+        finally:
+            self._release(conn, reusable)
+
+    def _round_trip(self, conn: http.client.HTTPConnection, body: Union[bytes, Callable[[], Iterable[bytes]]],
+                    headers: Dict[str, str]) -> http.client.HTTPResponse:
+        conn.request("POST", self.path, body=body() if callable(body) else body, headers=headers)
+        return conn.getresponse()
+
+    def close(self) -> None:
+        """待機中のコネクションをすべて閉じる"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+
+class PendingResult:
+    """バッチ送信されたアクション1件分の結果"""
+
+    def __init__(self, action: str):
+        self.action = action
+        self._done = False
+        self._result: Any = None
+        self._error: Optional[str] = None
+        self._delivered = False
+
+    def _resolve(self, result: Any, error: Optional[str], delivered: bool = True) -> None:
+        self._result = result
+        self._error = error
+        self._delivered = delivered
+        self._done = True
+
+    def done(self) -> bool:
+        """送信済みで結果が確定しているか"""
+        return self._done
+
+    @property
+    def ok(self) -> bool:
+        """エラーなしで完了したか"""
+        return self._done and self._error is None
+
+    @property
+    def error(self) -> Optional[str]:
+        return self._error
+
+    @property
+    def delivered(self) -> bool:
+        """Ankiがこのアクションを処理して結果を返したか（multi自体の送信失敗ならFalse）"""
+        return self._delivered
+
+    def result(self) -> Any:
+        """結果を返す（エラーの場合は例外を送出）"""
+        if not self._done:
+            raise Exception(f"{self.action}: バッチがまだ送信されていません")
+        if self._error is not None:
+            raise Exception(f"AnkiConnect Error: {self._error}")
+        return self._result
+
+
+class RequestBatch:
+    """複数のアクションを溜めてmultiリクエスト1回で送信するキュー"""
+
+    def __init__(self, client: "AnkiConnectClient", max_actions: int = 1000):
+        if max_actions < 1:
+            raise ValueError("max_actions は1以上を指定してください")
+        self._client = client
+        self.max_actions = max_actions
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[str, Optional[Dict], PendingResult]] = []
+
+    def add(self, action: str, params: Optional[Dict] = None) -> PendingResult:
+        """アクションを追加（max_actionsに達すると自動で送信）"""
+        pending = PendingResult(action)
+        with self._lock:
+            self._queue.append((action, params, pending))
+            should_flush = len(self._queue) >= self.max_actions
+        if should_flush:
+            self.flush()
+        return pending
+
+    def flush(self) -> None:
+        """溜まっているアクションをmultiリクエストで送信し、各結果を振り分ける"""
+        with self._lock:
+            queued, self._queue = self._queue, []
+        if not queued:
+            return
+
+        actions = []
+        for action, params, _ in queued:
+            item: Dict[str, Any] = {"action": action, "version": 6}
+            if params:
+                item["params"] = params
+            actions.append(item)
+
+        try:
+            replies = self._client._send_request("multi", {"actions": actions}).get("result") or []
+        except Exception as e:
+            for _, _, pending in queued:
+                pending._resolve(None, str(e), delivered=False)
+            return
+
+        if len(replies) != len(queued):
+            message = f"multiの結果数が一致しません ({len(replies)}/{len(queued)})"
+            for _, _, pending in queued:
+                pending._resolve(None, message, delivered=False)
+            return
+
+        for (action, params, pending), reply in zip(queued, replies):
+            # version 6 では各結果が {"result": ..., "error": ...} で返る
+            if isinstance(reply, dict) and "error" in reply:
+                pending._resolve(reply.get("result"), reply["error"])
+            else:
+                pending._resolve(reply, None)
+            
+            if pending.ok:
+                self._client._write_through(action, params or {})
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def __enter__(self) -> "RequestBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+            return
+
+        # 例外で抜けた場合は送信せず、未送信の結果をエラーで確定させる
+        with self._lock:
+            queued, self._queue = self._queue, []
+        for _, _, pending in queued:
+            pending._resolve(None, "バッチが送信前に中断されました", delivered=False)
+
 
 class AnkiConnectClient:
     """AnkiConnect APIクライアント"""
     
-    def __init__(self, base_url: str = "http://localhost:8765"):
+    def __init__(self, base_url: Optional[str] = None, pool_size: int = 4,
+                 timeout: Optional[float] = None, metadata_ttl: Optional[float] = 60.0,
+                 duplicate_index: Optional[DuplicateIndex] = None, metrics: bool = True,
+                 note_ids: Optional[NoteIdMap] = None):
+        # 省略時は環境変数 ANKI_CONNECT_URL（未設定ならローカルのAnkiConnect）に接続
+        base_url = base_url or os.environ.get("ANKI_CONNECT_URL", DEFAULT_BASE_URL)
         self.base_url = base_url
+        self._pool = _ConnectionPool(base_url, size=pool_size, timeout=timeout)
+        
+        # 指定されている場合、add_notesは既知の重複ノートを送信前に取り除く
+        self.duplicate_index = duplicate_index
+        # 指定されている場合、add_notesは追加したノートIDを記録し、記録済みのカードは追加せずに更新する
+        self.note_ids = note_ids
+        
+        # デッキ名・ノートタイプ名のキャッシュ（アクション名 → (取得時刻, 名前の一覧)）
+        # metadata_ttl秒経過するか、Anki側で変更されたら再取得する。Noneなら期限なし、0なら無効
+        self.metadata_ttl = metadata_ttl
+        self._metadata: Dict[str, Tuple[float, List[str]]] = {}
+        self._metadata_lock = threading.Lock()
+        
+        # アクション別の回数・エラー・送受信バイト数・レイテンシ（metrics=Falseで無効）
+        self._metrics: Optional[ClientMetrics] = ClientMetrics() if metrics else None
+
+    def close(self) -> None:
+        """プール内のkeep-aliveコネクションを閉じる"""
+        self._pool.close()
+
+    def __enter__(self) -> "AnkiConnectClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def batch(self, max_actions: int = 1000) -> RequestBatch:
+        """複数のアクションをmultiリクエストにまとめるバッチを作成
+
+        with client.batch() as batch:
+            results = [batch.add("createDeck", {"deck": name}) for name in names]
+        # ブロックを抜けると送信され、results[i].result() で個別に結果を取得できる
+        """
+        return RequestBatch(self, max_actions)
         
     def _send_request(self, action: str, params: Optional[Dict] = None) -> Dict[str, Any]:
         """AnkiConnect APIにリクエストを送信"""
@@ -18,25 +312,109 @@ class AnkiConnectClient:
         }
         if params:
             data["params"] = params
-            
+        
         try:
             json_data = json.dumps(data).encode('utf-8')
-            
-            req = urllib.request.Request(
-                self.base_url,
-                data=json_data,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode('utf-8'))
+        except Exception as e:
+            raise Exception(f"Connection Error: {e}")
+        
+        return self._send_encoded(action, json_data, params)
+    
+    def _send_encoded(self, action: str, json_data: bytes, params: Optional[Dict] = None) -> Dict[str, Any]:
+        """エンコード済みのリクエスト本文を送信（paramsはメタデータのキャッシュ更新に使う）"""
+        return self._exchange(action, json_data, len(json_data), _read_response, params)
+    
+    def _send_streamed(self, action: str, body: Callable[[], Iterable[bytes]],
+                       content_length: int) -> Dict[str, Any]:
+        """
+        本文をチャンクごとに生成しながら送信し、レスポンスのresult配列も逐次読み込む
+        （本文・レスポンスの全体をメモリに置かない。bodyは再接続時にもう一度呼ばれる）
+        """
+        return self._exchange(action, body, content_length, _read_response_incrementally)
+    
+    def _exchange(self, action: str, body: Union[bytes, Callable[[], Iterable[bytes]]], content_length: int,
+                  read: Callable[[http.client.HTTPResponse], Tuple[Dict[str, Any], int]],
+                  params: Optional[Dict] = None) -> Dict[str, Any]:
+        start = time.perf_counter()
+        bytes_received = 0
+        failed = True
+        try:
+            headers = {'Content-Type': 'application/json', 'Content-Length': str(content_length)}
+            result, bytes_received = self._pool.post(body, headers, read)
             
             if result.get("error"):
                 raise Exception(f"AnkiConnect Error: {result['error']}")
-                
-            return result
+            failed = False
         except Exception as e:
             raise Exception(f"Connection Error: {e}")
+        finally:
+            if self._metrics is not None:
+                self._metrics.record(action, time.perf_counter() - start, content_length, bytes_received, failed)
+        
+        self._write_through(action, params or {})
+        return result
+    
+    def _cached_names(self, action: str, refresh: bool) -> List[str]:
+        """deckNames / modelNames の結果をTTL付きでキャッシュして返す"""
+        if not refresh and self.metadata_ttl != 0:
+            with self._metadata_lock:
+                cached = self._metadata.get(action)
+            if cached and (self.metadata_ttl is None or time.monotonic() - cached[0] < self.metadata_ttl):
+                return list(cached[1])
+        
+        names = self._send_request(action).get("result", [])
+        with self._metadata_lock:
+            self._metadata[action] = (time.monotonic(), list(names))
+        return names
+    
+    def _write_through(self, action: str, params: Dict[str, Any]) -> None:
+        """デッキ・ノートタイプを変更するアクションの成功時にキャッシュを更新"""
+        if action == "deleteDecks" and self.duplicate_index is not None:
+            # 削除したデッキのノートは重複として扱わない
+            self.duplicate_index.forget_decks(params.get("decks", []))
+        
+        with self._metadata_lock:
+            decks = self._metadata.get("deckNames")
+            models = self._metadata.get("modelNames")
+            
+            if decks and action in ("createDeck", "changeDeck"):
+                name = params.get("deck", "")
+                # 「親::子」形式のデッキは親デッキも同時に作成される
+                parts = name.split("::")
+                for depth in range(1, len(parts) + 1):
+                    parent = "::".join(parts[:depth])
+                    if parent and parent not in decks[1]:
+                        decks[1].append(parent)
+            
+            elif decks and action == "deleteDecks":
+                # 親デッキを削除すると子デッキも削除される
+                deleted = params.get("decks", [])
+                decks[1][:] = [
+                    deck for deck in decks[1]
+                    if not any(deck == name or deck.startswith(name + "::") for name in deleted)
+                ]
+            
+            elif models and action == "createModel":
+                name = params.get("modelName")
+                if name and name not in models[1]:
+                    models[1].append(name)
+    
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """アクション別メトリクスのスナップショット（無効の場合は空）"""
+        return self._metrics.snapshot() if self._metrics is not None else {}
+    
+    def prometheus_metrics(self, prefix: str = "anki_connect") -> str:
+        """アクション別メトリクスをPrometheusのテキスト形式で返す"""
+        return self._metrics.prometheus(prefix) if self._metrics is not None else ""
+    
+    def reset_metrics(self) -> None:
+        if self._metrics is not None:
+            self._metrics.reset()
+    
+    def invalidate_metadata(self) -> None:
+        """デッキ名・ノートタイプ名のキャッシュを破棄"""
+        with self._metadata_lock:
+            self._metadata.clear()
     
     def test_connection(self) -> bool:
         """AnkiConnect APIの接続をテスト"""
@@ -46,15 +424,17 @@ class AnkiConnectClient:
         except Exception:
             return False
     
-    def get_deck_names(self) -> List[str]:
-        """利用可能なデッキ名を取得"""
-        result = self._send_request("deckNames")
-        return result.get("result", [])
+    def get_deck_names(self, refresh: bool = False) -> List[str]:
+        """利用可能なデッキ名を取得（キャッシュが有効な間は再取得しない）"""
+        return self._cached_names("deckNames", refresh)
+    
+    def get_model_names(self, refresh: bool = False) -> List[str]:
+        """利用可能なノートタイプを取得（キャッシュが有効な間は再取得しない）"""
+        return self._cached_names("modelNames", refresh)
     
-    def get_model_names(self) -> List[str]:
-        """利用可能なノートタイプを取得"""
-        result = self._send_request("modelNames")
-        return result.get("result", [])
+    def has_deck(self, deck_name: str) -> bool:
+        """デッキが存在するか（キャッシュを利用）"""
+        return deck_name in self.get_deck_names()
     
     def add_note(self, card: AnkiCard) -> int:
         """単一のカードをAnkiに追加"""
@@ -62,15 +442,91 @@ class AnkiConnectClient:
         result = self._send_request("addNote", note_data["params"])
         return result.get("result")  # ノートIDを返す
     
-    def add_notes(self, cards: List[AnkiCard]) -> List[int]:
-        """複数のカードをAnkiに追加"""
-        notes = []
-        for card in cards:
-            note_format = card.to_anki_connect_format()
-            notes.append(note_format["params"]["note"])
+    def add_notes(self, cards: Iterable[AnkiCard]) -> List[Optional[int]]:
+        """
+        複数のカードをAnkiに追加（追加できなかったカードの位置はNone）
+        本文はカードから逐次エンコードしてソケットに書き込むため、バッチ全体の本文をメモリに置かない
+        note_idsが指定されている場合、以前に追加したカードは追加せずに記録済みのノートIDを返す
+        （表面・裏面が変わっていればupdateNoteFieldsで更新する。更新に失敗した位置はNone）
+        """
+        cards = cards if isinstance(cards, Sequence) else list(cards)
+        if self.note_ids is None:
+            return self._add_new_notes(cards)
+        
+        results, _, failed = self.note_ids.reconcile(self, cards)
+        positions = [i for i, note_id in enumerate(results) if note_id is None]
+        for i in failed:
+            results[i] = None
+        if positions:
+            new_cards = [cards[i] for i in positions]
+            note_ids = self._add_new_notes(new_cards)
+            self.note_ids.record_added(new_cards, note_ids)
+            for i, note_id in zip(positions, note_ids):
+                results[i] = note_id
+        return results
+    
+    def _add_new_notes(self, cards: Sequence[AnkiCard]) -> List[Optional[int]]:
+        """add_notesのうち、addNotesで新しく追加する部分（重複インデックスの判定を含む）"""
+        if self.duplicate_index is None:
+            return self._stream_add_notes(cards)
+        
+        # 既知の重複は送信せずに取り除き、結果の位置だけNoneで埋める
+        self.duplicate_index.ensure_seeded(self, set(card.deck_name for card in cards))
+        fingerprints = self.duplicate_index.split_cards(cards)
+        new_cards = [card for card, fp in zip(cards, fingerprints) if fp is not None]
+        
+        note_ids = iter(self._stream_add_notes(new_cards) if new_cards else [])
+        results = []
+        added = []
+        for card, fp in zip(cards, fingerprints):
+            note_id = next(note_ids, None) if fp is not None else None
+            results.append(note_id)
+            if note_id:
+                added.append((fp, card.deck_name))
+        
+        self.duplicate_index.add_many(added)
+        return results
+    
+    def _stream_add_notes(self, cards: Sequence[AnkiCard]) -> List[Optional[int]]:
+        """
+        カードをaddNotes1回で送信
+        Content-Lengthを先に求めるため、カードを2回エンコードする（1回目は長さの計算だけ）
+        """
+        content_length = add_notes_request_length(card.encode_note() for card in cards)
+        body = lambda: iter_add_notes_request(card.encode_note() for card in cards)
+        return self._send_streamed("addNotes", body, content_length).get("result") or []
+    
+    def add_card_batch(self, batch: CardBatch, chunk_size: int = 500,
+                       max_chunk_bytes: int = 4 * 1024 * 1024) -> List[Optional[int]]:
+        """
+        CardBatchをノートの辞書を作らずにaddNotesで送信
+        戻り値はバッチと同じ順のノートID（追加できなかった・送信しなかった位置はNone）
+        """
+        if self.note_ids is not None:
+            # 記録済みのカードの判定はカード単位で行う
+            return self.add_notes(list(batch))
+        
+        results: List[Optional[int]] = [None] * len(batch)
+        indices: Optional[List[int]] = None
+        fingerprints: Dict[int, bytes] = {}
+        
+        if self.duplicate_index is not None:
+            # 既知の重複は送信する本文に含めない
+            self.duplicate_index.ensure_seeded(self, batch.deck_names())
+            fingerprints = dict(self.duplicate_index.split_card_batch(batch))
+            indices = list(fingerprints)
+        
+        added = []
+        for chunk, body in batch.iter_add_notes_requests(indices, chunk_size, max_chunk_bytes):
+            note_ids = self._send_encoded("addNotes", body).get("result") or []
+            for i, note_id in zip(chunk, note_ids):
+                results[i] = note_id
+                if note_id and i in fingerprints:
+                    added.append((fingerprints[i], batch.deck_name(i)))
         
-        result = self._send_request("addNotes", {"notes": notes})
-        return result.get("result", [])
+        if added:
+            self.duplicate_index.add_many(added)
+        return results
     
     def create_deck(self, deck_name: str) -> bool:
         """新しいデッキを作成"""
@@ -83,7 +539,7 @@ class AnkiConnectClient:
     def add_learning_content(self, content: LearningContent, deck_name: str = "LLM学習") -> List[int]:
         """学習内容からカードを生成してAnkiに追加"""
         # デッキが存在しない場合は作成
-        if deck_name not in self.get_deck_names():
+        if not self.has_deck(deck_name):
             self.create_deck(deck_name)
         
         # カードを生成
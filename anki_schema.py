@@ -1,38 +1,150 @@
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Sequence, Tuple
 import json
+import sys
 
-@dataclass
+# ノートタイプ「基本」のフィールド名
+FRONT_FIELD = "表面"
+BACK_FIELD = "裏面"
+
+# addNotesリクエスト本文の前後（間にエンコード済みのノートを ", " 区切りで並べる）
+_ADD_NOTES_HEAD = '{"action": "addNotes", "version": 6, "params": {"notes": ['
+_ADD_NOTES_TAIL = ']}}'
+_BACK_FIELD_SEPARATOR = f", {encode_basestring_ascii(BACK_FIELD)}: "
+
+# 同じタグの組み合わせは1つのタプルを共有する（上限を超えたら共有せずに作る）
+_TAG_SET_CACHE_LIMIT = 65536
+_tag_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def intern_name(name: str) -> str:
+    """デッキ名・ノートタイプ名を共有文字列にする（大量のカードで同じ名前を1つだけ保持）"""
+    return sys.intern(name) if type(name) is str else name
+
+
+def intern_tags(tags: Optional[Sequence[str]]) -> Optional[Tuple[str, ...]]:
+    """タグの並びを共有のタプルにする（Noneはそのまま）"""
+    if tags is None:
+        return None
+    key = tuple(tags)
+    shared = _tag_sets.get(key)
+    if shared is not None:
+        return shared
+    shared = tuple(intern_name(tag) for tag in key)
+    if len(_tag_sets) < _TAG_SET_CACHE_LIMIT:
+        _tag_sets[shared] = shared
+    return shared
+
+
+@lru_cache(maxsize=1024)
+def _note_prefix(deck_name: str, model_name: str) -> str:
+    return (f'{{"deckName": {encode_basestring_ascii(deck_name)}, '
+            f'"modelName": {encode_basestring_ascii(model_name)}, '
+            f'"fields": {{{encode_basestring_ascii(FRONT_FIELD)}: ')
+
+
+@lru_cache(maxsize=4096)
+def _tags_suffix(tags: Tuple[str, ...]) -> str:
+    if not tags:
+        return "}}"
+    return f'}}, "tags": [{", ".join(encode_basestring_ascii(tag) for tag in tags)}]}}'
+
+
+def encode_note(front: str, back: str, deck_name: str, model_name: str,
+                tags: Optional[Tuple[str, ...]]) -> str:
+    """
+    ノートをAnkiConnect形式のJSON文字列に直接エンコード（辞書を作らない）
+    json.dumps(card.to_anki_format()) と同じ出力になる
+    """
+    return (_note_prefix(deck_name, model_name) + encode_basestring_ascii(front)
+            + _BACK_FIELD_SEPARATOR + encode_basestring_ascii(back) + _tags_suffix(tags or ()))
+
+
+def encode_add_notes_request(encoded_notes: Sequence[str]) -> bytes:
+    """エンコード済みのノートからaddNotesのリクエスト本文を作成"""
+    return (_ADD_NOTES_HEAD + ", ".join(encoded_notes) + _ADD_NOTES_TAIL).encode("ascii")
+
+
+# addNotesの本文のうちノート以外の部分のバイト数
+ADD_NOTES_OVERHEAD = len(_ADD_NOTES_HEAD) + len(_ADD_NOTES_TAIL)
+
+
+def add_notes_request_length(encoded_notes: Iterable[str]) -> int:
+    """encode_add_notes_requestで作られる本文のバイト数（ASCIIなので文字数と同じ）"""
+    length = ADD_NOTES_OVERHEAD
+    count = 0
+    for note in encoded_notes:
+        length += len(note)
+        count += 1
+    return length + 2 * max(count - 1, 0)
+
+
+def iter_add_notes_request(encoded_notes: Iterable[str], buffer_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    encode_add_notes_requestと同じ本文を、全体を連結せずにbuffer_size程度のバイト列に区切って返す
+    （ソケットへ逐次書き込む用）
+    """
+    parts = [_ADD_NOTES_HEAD]
+    size = len(_ADD_NOTES_HEAD)
+    separator = ""
+    for note in encoded_notes:
+        parts.append(separator)
+        parts.append(note)
+        size += len(separator) + len(note)
+        separator = ", "
+        if size >= buffer_size:
+            yield "".join(parts).encode("ascii")
+            parts, size = [], 0
+    parts.append(_ADD_NOTES_TAIL)
+    yield "".join(parts).encode("ascii")
+
+
+@dataclass(slots=True)
 class AnkiCard:
     """Ankiカードのデータ構造"""
     front: str  # 表面（質問）
     back: str   # 裏面（答え）
     deck_name: str = "デフォルト"  # デッキ名
     model_name: str = "基本"      # ノートタイプ
-    tags: Optional[List[str]] = None  # タグ
+    tags: Optional[Sequence[str]] = None  # タグ（共有のタプルとして保持）
 
-    def to_anki_connect_format(self) -> Dict[str, Any]:
-        """AnkiConnect API用のフォーマットに変換"""
+    def __post_init__(self):
+        self.deck_name = intern_name(self.deck_name)
+        self.model_name = intern_name(self.model_name)
+        self.tags = intern_tags(self.tags)
+
+    def to_anki_format(self) -> Dict[str, Any]:
+        """AnkiConnectのノート形式（addNote / addNotes のnote）に変換"""
         note_data = {
             "deckName": self.deck_name,
             "modelName": self.model_name,
             "fields": {
-                "表面": self.front,
-                "裏面": self.back
+                FRONT_FIELD: self.front,
+                BACK_FIELD: self.back
             }
         }
         
         if self.tags:
             note_data["tags"] = self.tags
-            
+        
+        return note_data
+
+    def to_anki_connect_format(self) -> Dict[str, Any]:
+        """AnkiConnect API用のフォーマットに変換"""
         return {
             "action": "addNote",
             "version": 6,
             "params": {
-                "note": note_data
+                "note": self.to_anki_format()
             }
         }
 
+    def encode_note(self) -> str:
+        """ノートをJSON文字列に直接エンコード（addNotesの本文作成用）"""
+        return encode_note(self.front, self.back, self.deck_name, self.model_name, self.tags)
+
 @dataclass
 class LearningContent:
     """学習内容からAnkiカードを生成するためのデータ構造"""
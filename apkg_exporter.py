@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+カードをAnkiConnectを使わずに .apkg パッケージとして書き出すモジュール
+Ankiを起動していないビルド環境でも大量のカードからデッキを作成し、
+Ankiの「読み込む」で一度に取り込めるようにする
+
+使い方:
+    python3 apkg_exporter.py cards.jsonl -o 英単語.apkg --deck 英単語
+"""
+
+import argparse
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from direct_card_importer import DirectCardImporter
+from duplicate_index import fingerprint
+
+# Anki 2.1 の旧形式コレクション（collection.anki2, スキーマ11）
+_SCHEMA_VERSION = 11
+
+_SCHEMA_SQL = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null,
+    factor integer not null, time integer not null, type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+"""
+
+# 一括挿入の後に作成する（挿入中にインデックスを更新しない）
+_INDEX_SQL = """
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+_DEFAULT_DECK_CONFIG = {
+    "id": 1, "mod": 0, "name": "Default", "usn": 0, "maxTaken": 60, "autoplay": True,
+    "timer": 0, "replayq": True, "dyn": False,
+    "new": {"bury": False, "delays": [1, 10], "initialFactor": 2500, "ints": [1, 4, 0],
+            "order": 1, "perDay": 20, "separate": True},
+    "rev": {"bury": False, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500,
+            "perDay": 200, "minSpace": 1, "hardFactor": 1.2},
+    "lapse": {"delays": [10], "leechAction": 1, "leechFails": 8, "minInt": 1, "mult": 0},
+}
+
+_CARD_CSS = (".card {\n font-family: arial;\n font-size: 20px;\n text-align: center;\n"
+             " color: black;\n background-color: white;\n}\n")
+
+_LATEX_PRE = ("\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n"
+              "\\usepackage[utf8]{inputenc}\n\\usepackage{amssymb,amsmath}\n"
+              "\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n")
+_LATEX_POST = "\\end{document}"
+
+_FIELD_SEPARATOR = "\x1f"
+_IMG_SRC_RE = re.compile(r'(?i)<img[^>]+src=["\']?([^"\'>]+)["\']?[^>]*>')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_COMMENT_RE = re.compile(r'(?s)<!--.*?-->')
+
+
+def _strip_html_media(text: str) -> str:
+    """Ankiのソートフィールド・チェックサム用に、画像をファイル名に置き換えてHTMLを除去"""
+    text = _IMG_SRC_RE.sub(r' \1 ', text)
+    text = _COMMENT_RE.sub('', text)
+    return html.unescape(_HTML_TAG_RE.sub('', text)).strip()
+
+
+def _field_checksum(text: str) -> int:
+    """Ankiの重複チェックに使われる先頭フィールドのチェックサム"""
+    return int(hashlib.sha1(_strip_html_media(text).encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _stable_id(*parts: str) -> int:
+    """名前から決まるID（同じ名前なら毎回同じIDになり、再読み込み時に統合される）"""
+    digest = hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=5).digest()
+    return (1 << 40) + int.from_bytes(digest, "big")
+
+
+def _note_from_card(card: Any) -> Dict[str, Any]:
+    """AnkiCard（StructuredCardを含む）をAnkiConnect形式のノートに変換"""
+    return card.to_anki_format()
+
+
+class ApkgExporter(DirectCardImporter):
+    """
+    DirectCardImporterと同じ入力（表形式・JSON・ファイル）を受け取り、
+    AnkiConnectに送る代わりに .apkg ファイルへ書き出すクラス
+    import_* を呼ぶたびに output_path のパッケージを作り直す
+    """
+
+    # パッケージは最後にまとめて書き出すため、途中から再開するチェックポイントは使わない
+    checkpoint_files = False
+
+    def __init__(self, output_path: str, default_deck: str = "構造化学習",
+                 media_files: Optional[Iterable[str]] = None):
+        super().__init__(default_deck)
+        # Ankiには接続しない（解析処理だけを親クラスから使う）
+        self.anki_client = None
+        self.output_path = output_path
+        self.media_files = list(media_files or [])
+
+    def import_cards(self, cards: List[Any], chunk_size: int = 1000,
+                     max_chunk_bytes: int = 4 * 1024 * 1024) -> Dict[str, Any]:
+        """カードのリストを .apkg に書き出す（戻り値はDirectCardImporter.import_cardsと同じ形式）"""
+        if not cards:
+            return {"success": False, "message": "インポートするカードがありません"}
+
+        skipped_cards: List[Any] = []
+        result = self.write_package(cards, chunk_size, skipped_cards)
+        skipped_ids = set(map(id, skipped_cards))
+        result["successful_cards"] = [card for card in cards if id(card) not in skipped_ids]
+        result["failed_cards"] = []
+        result["skipped_cards"] = skipped_cards
+        return result
+
+    def import_card_stream(self, cards: Iterable[Any], chunk_size: int = 1000,
+                           max_chunk_bytes: int = 4 * 1024 * 1024,
+                           on_chunk: Optional[Callable[[int, int, int, int, int], None]] = None) -> Dict[str, Any]:
+        """
+        カードのイテレータを読みながら .apkg に書き出す（カードは保持しない）
+        パッケージは全件を書き終えるまで完成しないため、on_chunkは呼ばない
+        """
+        result = self.write_package(cards, chunk_size)
+        if result["total_cards"] == 0:
+            return {"success": False, "message": "インポートするカードがありません"}
+        return result
+
+    def import_card_batch(self, batch: Any, chunk_size: int = 1000,
+                          max_chunk_bytes: int = 4 * 1024 * 1024) -> Dict[str, Any]:
+        """CardBatchを .apkg に書き出す（戻り値はimport_card_streamと同じ形式）"""
+        return self.import_card_stream(iter(batch), chunk_size, max_chunk_bytes)
+
+    def connect(self) -> bool:
+        """書き出し専用のためAnkiには接続しない（import_* はどれもここを通らない）"""
+        raise Exception("ApkgExporterはAnkiConnectに接続しません（import_* で .apkg に書き出してください）")
+
+    def add_media(self, path: str) -> str:
+        """パッケージに含めるメディアファイルを追加し、フィールドから参照するファイル名を返す"""
+        self.media_files.append(path)
+        return os.path.basename(path)
+
+    def write_package(self, cards: Iterable[Any], batch_size: int = 1000,
+                      skipped_cards: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """
+        カードを1トランザクション内の一括挿入でコレクションに書き込み、
+        メディアと一緒に .apkg（zip）にまとめる
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size は1以上を指定してください")
+
+        directory = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, db_path = tempfile.mkstemp(suffix=".anki2", dir=directory)
+        os.close(fd)
+        tmp_package = self.output_path + ".tmp"
+
+        try:
+            stats = self._write_collection(db_path, cards, batch_size, skipped_cards)
+            self._write_zip(tmp_package, db_path)
+            # 書き込み途中のファイルが残らないよう、完成してから置き換える
+            os.replace(tmp_package, self.output_path)
+        finally:
+            for path in (db_path, tmp_package):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        print(f"📦 {stats['successful']}枚のカードを {self.output_path} に書き出しました")
+        if stats["skipped"]:
+            print(f"⏭️  同じ表面の重複 {stats['skipped']}枚は書き出しませんでした")
+
+        return {
+            "success": True,
+            "path": self.output_path,
+            "total_cards": stats["total"],
+            "successful": stats["successful"],
+            "failed": 0,
+            "skipped": stats["skipped"],
+            "decks": stats["decks"],
+        }
+
+    def _write_collection(self, db_path: str, cards: Iterable[Any], batch_size: int,
+                          skipped_cards: Optional[List[Any]]) -> Dict[str, Any]:
+        conn = sqlite3.connect(db_path)
+        try:
+            # 一時ファイルなのでジャーナルと同期書き込みは不要
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.executescript(_SCHEMA_SQL)
+
+            now = int(time.time())
+            models: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+            decks: Dict[str, int] = {}
+            tags: Set[str] = set()
+            seen_guids: Set[str] = set()
+            counts = {"total": 0, "successful": 0, "skipped": 0}
+
+            def rows() -> Iterator[Tuple[tuple, tuple]]:
+                # ノートIDとカードIDは作成時刻（ミリ秒）から連番で振る
+                base_id = int(time.time() * 1000)
+                for card in cards:
+                    counts["total"] += 1
+                    note = _note_from_card(card)
+                    fields = note.get("fields", {})
+                    values = [str(value) for value in fields.values()]
+                    front = values[0] if values else ""
+                    deck_name = note.get("deckName") or self.default_deck
+                    model_name = note.get("modelName") or "基本"
+
+                    # 同じ (デッキ, ノートタイプ, 表面) は同じGUIDにし、再読み込み時に重複させない
+                    guid = base64.b64encode(fingerprint(deck_name, model_name, front)[:10]).decode("ascii")
+                    if guid in seen_guids:
+                        counts["skipped"] += 1
+                        if skipped_cards is not None:
+                            skipped_cards.append(card)
+                        continue
+                    seen_guids.add(guid)
+
+                    model = self._model_for(models, model_name, tuple(fields.keys()), now)
+                    deck_id = self._deck_id(decks, deck_name)
+                    note_tags = [tag.replace(" ", "_") for tag in (note.get("tags") or []) if tag]
+                    tags.update(note_tags)
+
+                    position = counts["successful"]
+                    note_id = base_id + position
+                    counts["successful"] += 1
+
+                    yield (
+                        (note_id, guid, model["id"], now, -1,
+                         f" {' '.join(note_tags)} " if note_tags else "",
+                         _FIELD_SEPARATOR.join(values), _strip_html_media(front),
+                         _field_checksum(front), 0, ""),
+                        # 新規カード: type=0, queue=0, dueは追加順
+                        (note_id, note_id, deck_id, 0, now, -1, 0, 0, position,
+                         0, 0, 0, 0, 0, 0, 0, 0, ""),
+                    )
+
+            # 全カードを1つのトランザクションでbatch_size件ずつ一括挿入
+            with conn:
+                batch: List[Tuple[tuple, tuple]] = []
+                for row in rows():
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        self._insert_batch(conn, batch)
+                        batch = []
+                if batch:
+                    self._insert_batch(conn, batch)
+
+                # executescriptはトランザクションをコミットしてしまうため1文ずつ実行
+                for statement in _INDEX_SQL.strip().split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+
+                conn.execute(
+                    "INSERT INTO col VALUES (1, ?, ?, ?, ?, 0, 0, 0, ?, ?, ?, ?, ?)",
+                    (
+                        now, now * 1000, now * 1000, _SCHEMA_VERSION,
+                        json.dumps(self._collection_config(models, decks, counts["successful"])),
+                        json.dumps({str(model["id"]): model for model in models.values()}, ensure_ascii=False),
+                        json.dumps(self._deck_entries(decks, now), ensure_ascii=False),
+                        json.dumps({"1": _DEFAULT_DECK_CONFIG}),
+                        json.dumps({tag: 0 for tag in sorted(tags)}, ensure_ascii=False),
+                    ),
+                )
+        finally:
+            conn.close()
+
+        counts["decks"] = sorted(decks)
+        return counts
+
+    @staticmethod
+    def _insert_batch(conn: sqlite3.Connection, batch: List[Tuple[tuple, tuple]]) -> None:
+        conn.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", (row[0] for row in batch))
+        conn.executemany("INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                         (row[1] for row in batch))
+
+    def _write_zip(self, package_path: str, db_path: str) -> None:
+        """collection.anki2 とメディア（0, 1, ... のファイル名 + mediaマニフェスト）をzipにまとめる"""
+        manifest: Dict[str, str] = {}
+        with zipfile.ZipFile(package_path, "w", zipfile.ZIP_DEFLATED) as package:
+            package.write(db_path, "collection.anki2")
+            for index, media_path in enumerate(self.media_files):
+                package.write(media_path, str(index))
+                manifest[str(index)] = os.path.basename(media_path)
+            package.writestr("media", json.dumps(manifest, ensure_ascii=False))
+
+    @staticmethod
+    def _model_for(models: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]], model_name: str,
+                   field_names: Tuple[str, ...], now: int) -> Dict[str, Any]:
+        """ノートタイプ名とフィールド構成ごとに、表面→裏面の標準ノートタイプを1つ作成"""
+        key = (model_name, field_names)
+        model = models.get(key)
+        if model is not None:
+            return model
+
+        field_names = field_names or ("表面", "裏面")
+        front, back_fields = field_names[0], field_names[1:]
+        answer = "<br>\n".join("{{%s}}" % name for name in back_fields)
+        model = {
+            "id": _stable_id("model", model_name, *field_names),
+            "name": model_name,
+            "type": 0,
+            "mod": now,
+            "usn": -1,
+            "sortf": 0,
+            "did": 1,
+            "tmpls": [{
+                "name": "カード 1",
+                "ord": 0,
+                "qfmt": "{{%s}}" % front,
+                "afmt": "{{FrontSide}}\n\n<hr id=answer>\n\n" + answer,
+                "bqfmt": "",
+                "bafmt": "",
+                "did": None,
+                "bfont": "",
+                "bsize": 0,
+            }],
+            "flds": [
+                {"name": name, "ord": order, "sticky": False, "rtl": False,
+                 "font": "Arial", "size": 20, "media": []}
+                for order, name in enumerate(field_names)
+            ],
+            "css": _CARD_CSS,
+            "latexPre": _LATEX_PRE,
+            "latexPost": _LATEX_POST,
+            "latexsvg": False,
+            "req": [[0, "any", [0]]],
+            "tags": [],
+            "vers": [],
+        }
+        models[key] = model
+        return model
+
+    @staticmethod
+    def _deck_id(decks: Dict[str, int], deck_name: str) -> int:
+        """デッキIDを返す（"親::子" の場合は親デッキも登録）"""
+        deck_id = decks.get(deck_name)
+        if deck_id is None:
+            parts = deck_name.split("::")
+            for depth in range(1, len(parts) + 1):
+                name = "::".join(parts[:depth])
+                if name not in decks:
+                    decks[name] = _stable_id("deck", name)
+            deck_id = decks[deck_name]
+        return deck_id
+
+    @staticmethod
+    def _deck_entries(decks: Dict[str, int], now: int) -> Dict[str, Dict[str, Any]]:
+        entries = {}
+        for name, deck_id in [("Default", 1)] + sorted(decks.items()):
+            entries[str(deck_id)] = {
+                "id": deck_id, "name": name, "mod": now, "usn": -1, "desc": "",
+                "dyn": 0, "conf": 1, "collapsed": False, "browserCollapsed": False,
+                "extendNew": 0, "extendRev": 0, "newToday": [0, 0], "revToday": [0, 0],
+                "lrnToday": [0, 0], "timeToday": [0, 0],
+            }
+        return entries
+
+    @staticmethod
+    def _collection_config(models: Dict[Any, Dict[str, Any]], decks: Dict[str, int],
+                           next_position: int) -> Dict[str, Any]:
+        first_model = next(iter(models.values()), None)
+        first_deck = next(iter(decks.values()), 1)
+        return {
+            "nextPos": next_position, "estTimes": True, "activeDecks": [first_deck],
+            "sortType": "noteFld", "timeLim": 0, "sortBackwards": False, "addToCur": True,
+            "curDeck": first_deck, "newBust": True, "newSpread": 0, "dueCounts": True,
+            "curModel": first_model["id"] if first_model else None, "collapseTime": 1200,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="カードを .apkg パッケージに書き出す（Anki不要）")
+    parser.add_argument("path", help="入力ファイル（表形式・JSON・JSONL）")
+    parser.add_argument("-o", "--output", required=True, help="出力する .apkg ファイル")
+    parser.add_argument("--deck", default="構造化学習", help="デッキ名")
+    parser.add_argument("--format", default="auto", choices=["auto", "table", "json"], help="入力形式")
+    parser.add_argument("--media", nargs="*", default=[], help="パッケージに含めるメディアファイル")
+    args = parser.parse_args()
+
+    exporter = ApkgExporter(args.output, args.deck, media_files=args.media)
+    result = exporter.import_from_file(args.path, args.deck, args.format)
+
+    if result.get("success"):
+        print(f"\n📊 書き出し結果:")
+        print(f"   総カード数: {result['total_cards']}")
+        print(f"   書き出し: {result['successful']}")
+        print(f"   デッキ: {', '.join(result['decks'])}")
+    else:
+        print(f"❌ 書き出しに失敗しました: {result.get('message')}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+asyncio対応のAnkiConnect APIクライアント
+イベントループをブロックせずにAnkiへの書き込みとLLM呼び出しを並行させる
+"""
+
+import asyncio
+import json
+import os
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
+from anki_schema import AnkiCard, LearningContent
+from anki_client import DEFAULT_BASE_URL
+from client_metrics import ClientMetrics
+
+_Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class AsyncAnkiConnectClient:
+    """asyncioストリーム上でkeep-alive接続を使うAnkiConnectクライアント"""
+
+    def __init__(self, base_url: Optional[str] = None, max_in_flight: int = 8,
+                 timeout: Optional[float] = None, metrics: bool = True):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight は1以上を指定してください")
+
+        # 省略時は環境変数 ANKI_CONNECT_URL（未設定ならローカルのAnkiConnect）に接続
+        base_url = base_url or os.environ.get("ANKI_CONNECT_URL", DEFAULT_BASE_URL)
+        parsed = urllib.parse.urlsplit(base_url)
+        self.base_url = base_url
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.path = parsed.path or "/"
+        self.use_ssl = parsed.scheme == "https"
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+
+        # 同時に送信中のリクエスト数をmax_in_flightに制限する
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._idle: List[_Connection] = []
+        # アクション別の回数・エラー・送受信バイト数・レイテンシ（metrics=Falseで無効）
+        self._metrics: Optional[ClientMetrics] = ClientMetrics() if metrics else None
+
+    async def close(self) -> None:
+        """待機中のkeep-alive接続をすべて閉じる"""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def __aenter__(self) -> "AsyncAnkiConnectClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _open_connection(self) -> _Connection:
+        return await asyncio.open_connection(self.host, self.port, ssl=self.use_ssl or None)
+
+    async def _round_trip(self, conn: _Connection, body: bytes) -> Tuple[bytes, bool]:
+        """HTTP/1.1でPOSTを1往復し、(本文, 接続を再利用できるか) を返す"""
+        reader, writer = conn
+        head = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("latin-1")
+        writer.write(head + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("サーバーが接続を閉じました")
+        parts = status_line.decode("latin-1").split(None, 2)
+        status = int(parts[1])
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            payload = await reader.readexactly(int(headers["content-length"]))
+            reusable = headers.get("connection", "").lower() != "close"
+        else:
+            payload = await reader.read()
+            reusable = False
+
+        if status != 200:
+            raise Exception(f"HTTP Error {status}: {parts[2].strip() if len(parts) > 2 else ''}")
+
+        return payload, reusable
+
+    async def _post(self, body: bytes) -> bytes:
+        async with self._slots:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await self._open_connection()
+            reusable = False
+            try:
+                try:
+                    payload, reusable = await self._round_trip(conn, body)
+                except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                    # 待機中に切断されたkeep-alive接続は一度だけ張り直す
+                    if not reused:
+                        raise
+                    conn[1].close()
+                    conn = await self._open_connection()
+                    payload, reusable = await self._round_trip(conn, body)
+                return payload
+            finally:
+                if reusable:
+                    self._idle.append(conn)
+                else:
+                    conn[1].close()
+
+    async def _send_request(self, action: str, params: Optional[Dict] = None) -> Dict[str, Any]:
+        """AnkiConnect APIにリクエストを送信"""
+        data = {
+            "action": action,
+            "version": 6
+        }
+        if params:
+            data["params"] = params
+
+        start = time.perf_counter()
+        bytes_sent = bytes_received = 0
+        failed = True
+        try:
+            json_data = json.dumps(data).encode('utf-8')
+            bytes_sent = len(json_data)
+
+            response_body = await asyncio.wait_for(self._post(json_data), self.timeout)
+            bytes_received = len(response_body)
+            result = json.loads(response_body.decode('utf-8'))
+
+            if result.get("error"):
+                raise Exception(f"AnkiConnect Error: {result['error']}")
+
+            failed = False
+            return result
+        except Exception as e:
+            raise Exception(f"Connection Error: {e}")
+        finally:
+            if self._metrics is not None:
+                self._metrics.record(action, time.perf_counter() - start, bytes_sent, bytes_received, failed)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """アクション別メトリクスのスナップショット（無効の場合は空）"""
+        return self._metrics.snapshot() if self._metrics is not None else {}
+
+    def prometheus_metrics(self, prefix: str = "anki_connect") -> str:
+        """アクション別メトリクスをPrometheusのテキスト形式で返す"""
+        return self._metrics.prometheus(prefix) if self._metrics is not None else ""
+
+    async def test_connection(self) -> bool:
+        """AnkiConnect APIの接続をテスト"""
+        try:
+            result = await self._send_request("version")
+            return result.get("result") == 6
+        except Exception:
+            return False
+
+    async def get_deck_names(self) -> List[str]:
+        """利用可能なデッキ名を取得"""
+        result = await self._send_request("deckNames")
+        return result.get("result", [])
+
+    async def get_model_names(self) -> List[str]:
+        """利用可能なノートタイプを取得"""
+        result = await self._send_request("modelNames")
+        return result.get("result", [])
+
+    async def add_note(self, card: AnkiCard) -> int:
+        """単一のカードをAnkiに追加"""
+        note_data = card.to_anki_connect_format()
+        result = await self._send_request("addNote", note_data["params"])
+        return result.get("result")  # ノートIDを返す
+
+    async def add_notes(self, cards: List[AnkiCard]) -> List[int]:
+        """複数のカードをAnkiに追加"""
+        notes = [card.to_anki_format() for card in cards]
+        result = await self._send_request("addNotes", {"notes": notes})
+        return result.get("result", [])
+
+    async def create_deck(self, deck_name: str) -> bool:
+        """新しいデッキを作成"""
+        try:
+            await self._send_request("createDeck", {"deck": deck_name})
+            return True
+        except Exception:
+            return False
+
+    async def add_learning_content(self, content: LearningContent, deck_name: str = "LLM学習") -> List[int]:
+        """学習内容からカードを生成してAnkiに追加"""
+        # デッキが存在しない場合は作成
+        if deck_name not in await self.get_deck_names():
+            await self.create_deck(deck_name)
+
+        # カードを生成
+        cards = content.extract_cards()
+
+        # デッキ名を設定
+        for card in cards:
+            card.deck_name = deck_name
+
+        # Ankiに追加
+        return await self.add_notes(cards)
+
+
+# 使用例
+async def test_async_anki_client():
+    """AsyncAnkiConnectClientのテスト"""
+    async with AsyncAnkiConnectClient() as client:
+        print("=== AnkiConnect接続テスト (asyncio) ===")
+        if not await client.test_connection():
+            print("❌ AnkiConnectに接続できません")
+            return False
+        print("✅ AnkiConnect接続成功")
+
+        # デッキ名とノートタイプを並行して取得
+        decks, models = await asyncio.gather(client.get_deck_names(), client.get_model_names())
+
+        print("\n=== 利用可能なデッキ ===")
+        for deck in decks:
+            print(f"  - {deck}")
+
+        print("\n=== 利用可能なノートタイプ ===")
+        for model in models:
+            print(f"  - {model}")
+
+    return True
+
+if __name__ == "__main__":
+    asyncio.run(test_async_anki_client())
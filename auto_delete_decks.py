@@ -4,12 +4,14 @@
 """
 
 from anki_client import AnkiConnectClient
+from duplicate_index import DuplicateIndex
 
 def auto_delete_all_decks():
     """すべてのデッキを自動削除（デフォルトを除く）"""
     
     try:
-        client = AnkiConnectClient()
+        # 重複インデックスがあれば、削除したデッキのハッシュも一緒に消す
+        client = AnkiConnectClient(duplicate_index=DuplicateIndex.open_existing())
         
         # 接続確認
         if not client.test_connection():
@@ -38,23 +40,22 @@ def auto_delete_all_decks():
         deleted_count = 0
         failed_count = 0
         
-        for deck_name in deletable_decks:
-            try:
-                # デッキ削除API呼び出し
-                result = client._send_request("deleteDecks", {
+        # デッキ削除API呼び出し（multiリクエスト1回にまとめ、結果はデッキごとに確認）
+        with client.batch() as batch:
+            results = {
+                deck_name: batch.add("deleteDecks", {
                     "decks": [deck_name],
                     "cardsToo": True  # カードも一緒に削除
                 })
-                
-                if result.get("error"):
-                    print(f"❌ {deck_name}: 削除失敗 - {result['error']}")
-                    failed_count += 1
-                else:
-                    print(f"✅ {deck_name}: 削除完了")
-                    deleted_count += 1
-                    
-            except Exception as e:
-                print(f"❌ {deck_name}: エラー - {e}")
+                for deck_name in deletable_decks
+            }
+        
+        for deck_name, pending in results.items():
+            if pending.ok:
+                print(f"✅ {deck_name}: 削除完了")
+                deleted_count += 1
+            else:
+                print(f"❌ {deck_name}: 削除失敗 - {pending.error}")
                 failed_count += 1
         
         # 結果報告
@@ -63,7 +64,7 @@ def auto_delete_all_decks():
         print(f"   失敗: {failed_count}個")
         
         # 最終確認
-        remaining_decks = client.get_deck_names()
+        remaining_decks = client.get_deck_names(refresh=True)
         print(f"\n📂 残っているデッキ ({len(remaining_decks)}個):")
         for deck in remaining_decks:
             print(f"   - {deck}")
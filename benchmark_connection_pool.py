@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+AnkiConnectClientのコネクションプール効果を計測するベンチマーク
+疑似AnkiConnectサーバーに対して、リクエストごとに接続する方式と比較する
+"""
+
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from anki_client import AnkiConnectClient
+from fake_anki_server import FakeAnkiConnectServer
+
+
+def _urlopen_request(base_url: str, action: str) -> dict:
+    """プール導入前と同じ、リクエストごとに新規接続する送信方式"""
+    data = json.dumps({"action": action, "version": 6}).encode("utf-8")
+    req = urllib.request.Request(base_url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def _measure(send, requests: int, threads: int) -> float:
+    """requests回の送信にかかった時間からrequests/secを返す"""
+    start = time.perf_counter()
+    if threads == 1:
+        for _ in range(requests):
+            send()
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for _ in executor.map(lambda _: send(), range(requests)):
+                pass
+    return requests / (time.perf_counter() - start)
+
+
+def run_benchmark(requests: int = 2000, threads: int = 1, pool_size: int = 4) -> dict:
+    """接続方式ごとのrequests/secを計測"""
+    with FakeAnkiConnectServer() as server:
+        before = _measure(lambda: _urlopen_request(server.url, "version"), requests, threads)
+
+        with AnkiConnectClient(server.url, pool_size=pool_size) as client:
+            after = _measure(lambda: client._send_request("version"), requests, threads)
+
+    return {
+        "requests": requests,
+        "threads": threads,
+        "pool_size": pool_size,
+        "per_request_connection_rps": round(before, 1),
+        "keep_alive_pool_rps": round(after, 1),
+        "speedup": round(after / before, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="コネクションプールのベンチマーク")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    args = parser.parse_args()
+
+    results = [run_benchmark(args.requests, threads, args.pool_size) for threads in args.threads]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print("📊 コネクションプール ベンチマーク")
+    for result in results:
+        print(f"\n🧵 スレッド数: {result['threads']} / リクエスト数: {result['requests']}")
+        print(f"   接続ごと (urlopen): {result['per_request_connection_rps']:.1f} req/s")
+        print(f"   keep-aliveプール:  {result['keep_alive_pool_rps']:.1f} req/s")
+        print(f"   高速化: {result['speedup']}倍")
+
+
+if __name__ == "__main__":
+    main()
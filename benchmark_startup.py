@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+エントリーポイントの起動時間を計測するベンチマーク
+新しいPythonプロセスで各モジュールをimportするまでの時間と、疑似AnkiConnectサーバーに対して
+カードを1枚だけインポートするワンショット実行（シェルスクリプトからの呼び出しを想定）の
+時間・往復回数を計測する
+
+使い方:
+    python3 benchmark_startup.py
+    python3 benchmark_startup.py --runs 20 --json
+"""
+
+import argparse
+import compileall
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from fake_anki_server import FakeAnkiConnectServer
+
+ENTRY_MODULES = ["simple_import", "direct_card_importer", "llm_interface", "quick_start",
+                 "stream_import", "apkg_exporter"]
+
+# ワンショット実行（{run}は実行ごとに変わる番号。重複として拒否されないように表面に含める）
+ONE_SHOTS = {
+    "quick_import": ("from simple_import import quick_import; "
+                     "quick_import([('起動ベンチマーク {run}', '回答')], '起動ベンチマーク')"),
+    "import_to_anki": ("from simple_import import import_to_anki; "
+                       "import_to_anki('起動ベンチマーク {run} | 回答 | startup', '起動ベンチマーク', 'table')"),
+}
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run_python(code: str, env: Optional[Dict[str, str]] = None) -> float:
+    """新しいPythonプロセスでcodeを実行し、終了までの秒数を返す"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=_HERE, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def _median_ms(samples: List[float]) -> float:
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def run_benchmark(runs: int = 10, modules: Optional[List[str]] = None) -> Dict[str, Any]:
+    """import時間（インタプリタ自体の起動時間を差し引いた値）とワンショット実行を計測"""
+    modules = modules or ENTRY_MODULES
+
+    # .pycの生成が計測に入らないように先にコンパイルしておく
+    # （PYTHONDONTWRITEBYTECODEが設定されていると、importでは.pycが更新されない）
+    compileall.compile_dir(_HERE, maxlevels=0, quiet=1)
+    interpreter = _median_ms([_run_python("pass") for _ in range(runs)])
+
+    imports = {}
+    for module in modules:
+        total = _median_ms([_run_python(f"import {module}") for _ in range(runs)])
+        imports[module] = {"total_ms": total, "import_ms": round(total - interpreter, 1)}
+
+    one_shots = {}
+    with FakeAnkiConnectServer(store_notes=False) as server:
+        env = dict(os.environ, ANKI_CONNECT_URL=server.url)
+        for name, template in ONE_SHOTS.items():
+            samples = []
+            round_trips = []
+            for run in range(runs):
+                server.reset_stats()
+                samples.append(_run_python(template.format(run=f"{name} {run}"), env))
+                round_trips.append(server.request_count)
+            one_shots[name] = {
+                "total_ms": _median_ms(samples),
+                "round_trips": max(round_trips),
+                "round_trips_by_action": dict(server.action_counts),
+            }
+
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "runs": runs,
+            "interpreter_ms": interpreter,
+        },
+        "imports": imports,
+        "one_shots": one_shots,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="エントリーポイントの起動時間ベンチマーク")
+    parser.add_argument("--runs", type=int, default=10, help="計測回数（中央値を表示）")
+    parser.add_argument("--modules", nargs="+", help="計測するモジュール")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.runs, args.modules)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"\n🚀 起動時間ベンチマーク（中央値, {args.runs}回, インタプリタ起動 {report['meta']['interpreter_ms']}ms）")
+    print(f"{'モジュール':<24}{'import(ms)':>12}{'合計(ms)':>12}")
+    for module, stats in report["imports"].items():
+        print(f"{module:<24}{stats['import_ms']:>12}{stats['total_ms']:>12}")
+
+    print(f"\n{'ワンショット実行':<24}{'合計(ms)':>12}{'往復':>8}")
+    for name, stats in report["one_shots"].items():
+        print(f"{name:<24}{stats['total_ms']:>12}{stats['round_trips']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+インポート処理のスループットを計測するベンチマークスイート
+インプロセスの疑似AnkiConnectサーバーに対して、主要なインポート経路ごとに
+cards/sec・往復回数（HTTPリクエスト数）・ピークメモリを計測する
+
+使い方:
+    python3 benchmark_suite.py                       # 100 / 1万 / 10万枚
+    python3 benchmark_suite.py --sizes 100 10000 --latency 0.002 --per-note-cost 0.00001
+    python3 benchmark_suite.py --json --output results.json
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from anki_client import AnkiConnectClient
+from anki_schema import AnkiCard
+from direct_card_importer import DirectCardImporter, StructuredCard
+from fake_anki_server import FakeAnkiConnectServer
+from llm_interface import LearningSession
+from simple_import import quick_import
+
+DEFAULT_SIZES = [100, 10_000, 100_000]
+BENCHMARK_DECK = "ベンチマーク"
+
+
+def _sample_pair(i: int) -> Tuple[str, str]:
+    return (f"benchmark question {i}: 用語{i}の意味は？",
+            f"用語{i}は、ベンチマーク用に生成されたサンプルの説明文です。<br>補足: {i}")
+
+
+def _sample_qa(i: int) -> Dict[str, str]:
+    return {
+        "question": f"技術{i}とは何ですか？",
+        "answer": (f"技術{i}とは、データを効率的に処理するための手法です。\n"
+                   f"主な特徴：\n1. 高速な処理\n2. 少ないメモリ使用量\n"
+                   f"技術{i}と従来手法の違いは、処理を分割する点です。"),
+        "topic": f"トピック{i % 10}",
+    }
+
+
+def _cards_per_qa() -> int:
+    """batch_modeで1件のQ&Aペアから生成されるカード数（Q&Aペア数の見積もりに使う）"""
+    from card_generator import SmartCardGenerator
+    qa = _sample_qa(0)
+    return max(1, len(SmartCardGenerator().generate_cards_from_llm_response(
+        qa["question"], qa["answer"], qa["topic"])))
+
+
+# シナリオ: cards枚を入力として準備する関数と、計測対象の処理を返す関数の組
+def _prepare_add_notes(size: int, options: Dict[str, Any]) -> Callable[[], Any]:
+    cards = [AnkiCard(*_sample_pair(i), deck_name=BENCHMARK_DECK, tags=["benchmark"]) for i in range(size)]
+
+    def run():
+        with AnkiConnectClient() as client:
+            if not client.has_deck(BENCHMARK_DECK):
+                client.create_deck(BENCHMARK_DECK)
+            return client.add_notes(cards)
+    return run
+
+
+def _prepare_import_cards(size: int, options: Dict[str, Any]) -> Callable[[], Any]:
+    cards = [StructuredCard(*_sample_pair(i), tags=["benchmark"], deck_name=BENCHMARK_DECK) for i in range(size)]
+
+    def run():
+        return DirectCardImporter(BENCHMARK_DECK).import_cards(cards)
+    return run
+
+
+def _prepare_quick_import(size: int, options: Dict[str, Any]) -> Callable[[], Any]:
+    pairs = [_sample_pair(i) for i in range(size)]
+
+    def run():
+        return quick_import(pairs, BENCHMARK_DECK, tags=["benchmark"])
+    return run
+
+
+def _prepare_batch_mode(size: int, options: Dict[str, Any]) -> Callable[[], Any]:
+    qa_pairs = [_sample_qa(i) for i in range(math.ceil(size / options["cards_per_qa"]))]
+
+    def run():
+        return LearningSession(BENCHMARK_DECK).batch_mode(qa_pairs, workers=options["batch_workers"])
+    return run
+
+
+SCENARIOS: Dict[str, Callable[[int, Dict[str, Any]], Callable[[], Any]]] = {
+    "add_notes": _prepare_add_notes,
+    "import_cards": _prepare_import_cards,
+    "quick_import": _prepare_quick_import,
+    "batch_mode": _prepare_batch_mode,
+}
+
+
+def _run_quietly(run: Callable[[], Any]) -> Any:
+    """計測対象の進捗表示は捨てる（端末への出力が計測結果に影響しないように）"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return run()
+
+
+def run_scenario(name: str, size: int, server: FakeAnkiConnectServer,
+                 options: Dict[str, Any], measure_memory: bool = True) -> Dict[str, Any]:
+    """1つのシナリオを計測（時間と往復回数の計測と、ピークメモリの計測は別々に実行する）"""
+    prepare = SCENARIOS[name]
+
+    # 1回目: tracemallocのオーバーヘッドなしで時間を計測
+    run = prepare(size, options)
+    gc.collect()
+    server.reset_stats()
+    start = time.perf_counter()
+    _run_quietly(run)
+    seconds = time.perf_counter() - start
+    notes_added = server.notes_added
+    round_trips = server.request_count
+    action_counts = dict(server.action_counts)
+    del run
+
+    # 2回目: 入力の準備を除いた、処理中に増えたメモリのピークを計測
+    # （疑似サーバーも同じプロセスで動くため、受信したリクエストの解析分も含まれる）
+    peak_mib = None
+    if measure_memory:
+        run = prepare(size, options)
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            _run_quietly(run)
+            peak_mib = (tracemalloc.get_traced_memory()[1] - baseline) / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+        del run
+
+    return {
+        "scenario": name,
+        "cards": size,
+        "notes_added": notes_added,
+        "seconds": round(seconds, 4),
+        "cards_per_sec": round(notes_added / seconds, 1) if seconds else None,
+        "round_trips": round_trips,
+        "round_trips_by_action": action_counts,
+        "peak_memory_mib": round(peak_mib, 2) if peak_mib is not None else None,
+    }
+
+
+def run_suite(sizes: List[int] = DEFAULT_SIZES, scenarios: Optional[List[str]] = None,
+              latency: float = 0.0, per_note_cost: float = 0.0, batch_workers: int = 1,
+              measure_memory: bool = True) -> Dict[str, Any]:
+    """すべてのシナリオ×カード枚数を計測し、機械可読な結果を返す"""
+    scenarios = scenarios or list(SCENARIOS)
+    options = {"batch_workers": batch_workers, "cards_per_qa": _cards_per_qa()}
+    results = []
+
+    previous_url = os.environ.get("ANKI_CONNECT_URL")
+    with FakeAnkiConnectServer(latency=latency, per_note_cost=per_note_cost, store_notes=False) as server:
+        # 引数なしで作られるクライアント（DirectCardImporterなど）も疑似サーバーに接続させる
+        os.environ["ANKI_CONNECT_URL"] = server.url
+        try:
+            for size in sizes:
+                for name in scenarios:
+                    result = run_scenario(name, size, server, options, measure_memory)
+                    results.append(result)
+                    print(f"⏱️  {name:<13} {size:>7}枚: {result['cards_per_sec']} cards/s, "
+                          f"{result['round_trips']}往復, ピーク {result['peak_memory_mib']} MiB",
+                          file=sys.stderr)
+        finally:
+            if previous_url is None:
+                os.environ.pop("ANKI_CONNECT_URL", None)
+            else:
+                os.environ["ANKI_CONNECT_URL"] = previous_url
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "latency": latency,
+            "per_note_cost": per_note_cost,
+            "batch_workers": batch_workers,
+            "cards_per_qa": options["cards_per_qa"],
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="インポート処理のスループットベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="カード枚数")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="計測するシナリオ")
+    parser.add_argument("--latency", type=float, default=0.0, help="リクエストごとの遅延（秒）")
+    parser.add_argument("--per-note-cost", type=float, default=0.0, help="ノート1件ごとの遅延（秒）")
+    parser.add_argument("--batch-workers", type=int, default=1, help="batch_modeのworkers")
+    parser.add_argument("--no-memory", action="store_true", help="ピークメモリを計測しない")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    parser.add_argument("--output", help="結果のJSONを保存するファイル")
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.scenarios, args.latency, args.per_note_cost,
+                       args.batch_workers, not args.no_memory)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print("\n📊 インポート ベンチマーク")
+    print(f"{'シナリオ':<14}{'枚数':>8}{'cards/s':>12}{'往復':>8}{'ピーク(MiB)':>14}")
+    for result in report["results"]:
+        peak = result["peak_memory_mib"]
+        print(f"{result['scenario']:<14}{result['cards']:>8}{result['cards_per_sec']:>12}"
+              f"{result['round_trips']:>8}{peak if peak is not None else '-':>14}")
+
+
+if __name__ == "__main__":
+    main()
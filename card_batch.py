@@ -0,0 +1,138 @@
+"""
+列指向のカードコンテナ
+表面・裏面の配列と、(デッキ, ノートタイプ)・タグの組み合わせのID配列だけを保持し、
+ノートごとの辞書を作らずにaddNotesのリクエスト本文へ直接シリアライズする
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from anki_schema import (ADD_NOTES_OVERHEAD, AnkiCard, encode_add_notes_request, encode_note,
+                         intern_name, intern_tags)
+
+
+class CardBatch:
+    """
+    大量のカードを並列配列で保持するコンテナ
+    - fronts / backs: 表面・裏面の文字列
+    - note_type_ids: (デッキ名, ノートタイプ名) の一覧への添字
+    - tag_set_ids: タグの組み合わせの一覧への添字
+    """
+
+    __slots__ = ("fronts", "backs", "note_type_ids", "tag_set_ids", "note_types", "tag_sets",
+                 "_note_type_index", "_tag_set_index")
+
+    def __init__(self, cards: Optional[Iterable[AnkiCard]] = None):
+        self.fronts: List[str] = []
+        self.backs: List[str] = []
+        self.note_type_ids = array("I")
+        self.tag_set_ids = array("I")
+        self.note_types: List[Tuple[str, str]] = []
+        self.tag_sets: List[Tuple[str, ...]] = []
+        self._note_type_index: Dict[Tuple[str, str], int] = {}
+        self._tag_set_index: Dict[Tuple[str, ...], int] = {}
+        if cards is not None:
+            self.extend(cards)
+
+    def __len__(self) -> int:
+        return len(self.fronts)
+
+    def append(self, front: str, back: str, deck_name: str = "デフォルト", model_name: str = "基本",
+               tags: Optional[Sequence[str]] = None) -> None:
+        """カード1枚分を追加"""
+        note_type = (deck_name, model_name)
+        note_type_id = self._note_type_index.get(note_type)
+        if note_type_id is None:
+            note_type_id = self._add_note_type(note_type)
+
+        tag_set = tuple(tags) if tags else ()
+        tag_set_id = self._tag_set_index.get(tag_set)
+        if tag_set_id is None:
+            tag_set_id = self._add_tag_set(tag_set)
+
+        self.fronts.append(front)
+        self.backs.append(back)
+        self.note_type_ids.append(note_type_id)
+        self.tag_set_ids.append(tag_set_id)
+
+    def add_card(self, card: AnkiCard) -> None:
+        """AnkiCard（StructuredCardを含む）を追加"""
+        self.append(card.front, card.back, card.deck_name, card.model_name, card.tags)
+
+    def extend(self, cards: Iterable[AnkiCard]) -> None:
+        for card in cards:
+            self.add_card(card)
+
+    def _add_note_type(self, note_type: Tuple[str, str]) -> int:
+        deck_name, model_name = intern_name(note_type[0]), intern_name(note_type[1])
+        note_type_id = len(self.note_types)
+        self.note_types.append((deck_name, model_name))
+        self._note_type_index[(deck_name, model_name)] = note_type_id
+        return note_type_id
+
+    def _add_tag_set(self, tag_set: Tuple[str, ...]) -> int:
+        shared = intern_tags(tag_set)
+        tag_set_id = len(self.tag_sets)
+        self.tag_sets.append(shared)
+        self._tag_set_index[shared] = tag_set_id
+        return tag_set_id
+
+    def deck_name(self, index: int) -> str:
+        return self.note_types[self.note_type_ids[index]][0]
+
+    def model_name(self, index: int) -> str:
+        return self.note_types[self.note_type_ids[index]][1]
+
+    def tags(self, index: int) -> Tuple[str, ...]:
+        return self.tag_sets[self.tag_set_ids[index]]
+
+    def deck_names(self) -> List[str]:
+        """このバッチに含まれるデッキ名（重複なし）"""
+        return list(dict.fromkeys(deck_name for deck_name, _ in self.note_types))
+
+    def card(self, index: int) -> AnkiCard:
+        """添字の位置のカードをAnkiCardとして取り出す"""
+        deck_name, model_name = self.note_types[self.note_type_ids[index]]
+        return AnkiCard(self.fronts[index], self.backs[index], deck_name, model_name,
+                        self.tags(index) or None)
+
+    def __iter__(self) -> Iterator[AnkiCard]:
+        for index in range(len(self)):
+            yield self.card(index)
+
+    def note(self, index: int) -> Dict[str, Any]:
+        """添字の位置のノートを辞書で返す（1枚ずつ再送する場合など）"""
+        return self.card(index).to_anki_format()
+
+    def encode_note(self, index: int) -> str:
+        """添字の位置のノートをJSON文字列にする（json.dumpsと同じ出力）"""
+        deck_name, model_name = self.note_types[self.note_type_ids[index]]
+        return encode_note(self.fronts[index], self.backs[index], deck_name, model_name,
+                           self.tag_sets[self.tag_set_ids[index]])
+
+    def iter_add_notes_requests(self, indices: Optional[Iterable[int]] = None, chunk_size: int = 500,
+                                max_chunk_bytes: int = 4 * 1024 * 1024) -> Iterator[Tuple[List[int], bytes]]:
+        """
+        addNotesのリクエスト本文を、カード数とバイト数の上限で区切って順に返す
+        戻り値は (含まれるカードの添字, リクエスト本文)
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size は1以上を指定してください")
+
+        chunk: List[int] = []
+        parts: List[str] = []
+        chunk_bytes = ADD_NOTES_OVERHEAD
+
+        for index in (range(len(self)) if indices is None else indices):
+            # ensure_ascii相当でエンコードしているので文字数 = バイト数
+            encoded = self.encode_note(index)
+            note_bytes = len(encoded) + 2
+            if chunk and (len(chunk) >= chunk_size or chunk_bytes + note_bytes > max_chunk_bytes):
+                yield chunk, encode_add_notes_request(parts)
+                chunk, parts, chunk_bytes = [], [], ADD_NOTES_OVERHEAD
+            chunk.append(index)
+            parts.append(encoded)
+            chunk_bytes += note_bytes
+
+        if chunk:
+            yield chunk, encode_add_notes_request(parts)
@@ -1,12 +1,169 @@
 import re
 import json
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterator, Iterable, Optional
 from anki_schema import AnkiCard, LearningContent
+from generator_profiler import CallProfile, StageProfiler
+
+# 重要概念の抽出パターン
+_TECH_TERM_RE = re.compile(r'[A-Za-z][A-Za-z0-9]*(?:[A-Za-z0-9\-_]*[A-Za-z0-9])*')
+_QUOTED_TERM_RE = re.compile(r'「([^」]+)」')
+_BULLET_POINT_RE = re.compile(r'[・•]\s*([^\n]+)')
+_NUMBERED_ITEM_RE = re.compile(r'\d+[\.．)\)]\s*([^\n]+)')
+
+# 定義を表す表現（概念の直後に続く部分）。並び順がそのまま優先順位
+_DEFINITION_TAIL_PATTERNS = [
+    re.compile(r"とは、([^。]+。)"),
+    re.compile(r"は、([^。]+。)"),
+    re.compile(r"：([^。\n]+)"),
+    re.compile(r"\s*[-－]\s*([^。\n]+)"),
+]
+# 定義表現の書き出し部分（走査時の絞り込み用）
+_DEFINITION_TAIL_PREFIX = r"(?:とは、|は、|：|\s*[-－])"
+_DEFINITION_SENTENCE_DELIMITER_RE = re.compile(r'[。．\n]')
+
+# 比較・対比の表現
+_COMPARISON_PATTERNS = [
+    re.compile(r'([^と\s]+)と([^と\s]+)の違い'),
+    re.compile(r'([^と\s]+)と([^と\s]+)を比較'),
+    re.compile(r'([^、\s]+)、([^、\s]+)の特徴'),
+]
+_COMPARISON_SENTENCE_SPLIT_RE = re.compile(r'[。．]')
+
+# 手順・トピック推定
+_STEP_RE = re.compile(r'(\d+)[\.．)\)]\s*([^\n]+)')
+_TOPIC_TECH_TERM_RE = re.compile(r'[A-Za-z][A-Za-z0-9]*')
+_TOPIC_JAPANESE_WORD_RE = re.compile(r'([ァ-ヶー]+|[一-龯]+)')
+
+def _compile_term_finder(terms: List[str], suffix: str = "") -> Tuple["re.Pattern", Dict[str, List[str]]]:
+    """
+    全語句の選択肢を1つにまとめたパターンを作成
+    長い順に並べるので各位置で一致する最長の語句が得られる。同じ位置に一致する
+    短い語句は必ずその接頭辞になるため、接頭辞の一覧も合わせて返す
+    """
+    ordered = sorted(terms, key=len, reverse=True)
+    alternation = "|".join(re.escape(term) for term in ordered)
+    finder = re.compile(f"({alternation})(?={suffix})" if suffix else f"({alternation})")
+    prefixes = {
+        term: [term] + [other for other in ordered if other != term and term.startswith(other)]
+        for term in ordered
+    }
+    return finder, prefixes
+
+
+def _iter_term_matches(finder: "re.Pattern", text: str) -> Iterator["re.Match"]:
+    """語句の出現位置を順に返す（重なり合う出現も1文字ずつずらして拾う）"""
+    pos = 0
+    while True:
+        match = finder.search(text, pos)
+        if not match:
+            return
+        yield match
+        pos = match.start() + 1
+
+
+class SentenceIndex:
+    """
+    1つの回答を一度だけ文に分割し、語句 → 文番号の転置インデックスを持つクラス
+    文の区切りは2種類を同時に扱う
+    - 行単位 (lines): 「。」「．」と改行で区切る（定義の抽出用）
+    - 文単位 (sentences): 「。」「．」だけで区切る（比較の抽出用）
+    """
+    
+    def __init__(self, text: str):
+        self.text = text
+        self._line_ends: List[int] = []
+        self._sentence_ends: List[int] = []
+        for match in _DEFINITION_SENTENCE_DELIMITER_RE.finditer(text):
+            self._line_ends.append(match.start())
+            if match.group() != "\n":
+                self._sentence_ends.append(match.start())
+        
+        # 語句 → その語句を含む行番号・文番号（昇順）
+        self._line_postings: Dict[str, List[int]] = {}
+        self._sentence_postings: Dict[str, List[int]] = {}
+        self._steps: Optional[List[Tuple[str, str]]] = None
+    
+    @staticmethod
+    def _span(ends: List[int], index: int, length: int) -> Tuple[int, int]:
+        start = ends[index - 1] + 1 if index > 0 else 0
+        end = ends[index] if index < len(ends) else length
+        return start, end
+    
+    def line(self, index: int) -> str:
+        """行番号から行の文字列を返す"""
+        start, end = self._span(self._line_ends, index, len(self.text))
+        return self.text[start:end]
+    
+    def sentence(self, index: int) -> str:
+        """文番号から文の文字列を返す"""
+        start, end = self._span(self._sentence_ends, index, len(self.text))
+        return self.text[start:end]
+    
+    def index_terms(self, terms: Iterable[str]) -> int:
+        """未登録の語句を本文1回の走査でまとめて転置インデックスに登録（戻り値は一致した回数）"""
+        pending = {term for term in terms if term and term not in self._line_postings}
+        if not pending:
+            return 0
+        
+        for term in pending:
+            self._line_postings[term] = []
+            self._sentence_postings[term] = []
+        
+        finder, prefixes = _compile_term_finder(list(pending))
+        line_ends = self._line_ends + [len(self.text)]
+        sentence_ends = self._sentence_ends + [len(self.text)]
+        line_index = 0
+        sentence_index = 0
+        matches = 0
+        
+        # 出現位置は昇順に得られるので、行番号・文番号は前から順に進めるだけでよい
+        for match in _iter_term_matches(finder, self.text):
+            matches += 1
+            start = match.start()
+            while line_ends[line_index] < start:
+                line_index += 1
+            while sentence_ends[sentence_index] < start:
+                sentence_index += 1
+            
+            for term in prefixes[match.group(1)]:
+                end = start + len(term)
+                # 区切り文字をまたぐ出現は、分割後の文には含まれない
+                if end <= line_ends[line_index]:
+                    postings = self._line_postings[term]
+                    if not postings or postings[-1] != line_index:
+                        postings.append(line_index)
+                if end <= sentence_ends[sentence_index]:
+                    postings = self._sentence_postings[term]
+                    if not postings or postings[-1] != sentence_index:
+                        postings.append(sentence_index)
+        
+        return matches
+    
+    def lines_containing(self, term: str) -> List[int]:
+        """語句を含む行番号の一覧"""
+        self.index_terms([term])
+        return self._line_postings.get(term, [])
+    
+    def sentences_containing(self, term: str) -> List[int]:
+        """語句を含む文番号の一覧"""
+        self.index_terms([term])
+        return self._sentence_postings.get(term, [])
+    
+    @property
+    def steps(self) -> List[Tuple[str, str]]:
+        """番号付きリストの (番号, 内容) 一覧（概念抽出と手順カードで共有）"""
+        if self._steps is None:
+            self._steps = _STEP_RE.findall(self.text)
+        return self._steps
+
 
 class SmartCardGenerator:
     """LLMの回答から効果的なAnkiカードを生成するクラス"""
     
-    def __init__(self):
+    def __init__(self, profile: bool = False, slowest: int = 10):
+        # profile=Trueの場合、ステージ別の処理時間・正規表現の一致数・カード数を集計する
+        self.profiler: Optional[StageProfiler] = StageProfiler(slowest) if profile else None
+        self._call: Optional[CallProfile] = None
         self.question_patterns = [
             r"(.+?)とは[？?]?",
             r"(.+?)の特徴は[？?]?",
@@ -15,20 +172,30 @@ class SmartCardGenerator:
             r"(.+?)の使い方は[？?]?",
             r"(.+?)について説明してください"
         ]
+    
+    def _count_matches(self, count: int) -> None:
+        """プロファイル中なら実行中のステージの一致数に加算"""
+        if self._call is not None:
+            self._call.count_matches(count)
         
-    def extract_key_concepts(self, text: str) -> List[str]:
+    def extract_key_concepts(self, text: str, index: Optional[SentenceIndex] = None) -> List[str]:
         """テキストから重要な概念を抽出"""
         # 技術用語（英数字混じり）をマッチ
-        tech_terms = re.findall(r'[A-Za-z][A-Za-z0-9]*(?:[A-Za-z0-9\-_]*[A-Za-z0-9])*', text)
+        tech_terms = _TECH_TERM_RE.findall(text)
         
         # 日本語の重要語句（「」で囲まれた部分）
-        quoted_terms = re.findall(r'「([^」]+)」', text)
+        quoted_terms = _QUOTED_TERM_RE.findall(text)
         
         # 箇条書きの項目
-        bullet_points = re.findall(r'[・•]\s*([^\n]+)', text)
+        bullet_points = _BULLET_POINT_RE.findall(text)
         
         # 数字付きリストの項目
-        numbered_items = re.findall(r'\d+[\.．)\)]\s*([^\n]+)', text)
+        if index is not None:
+            numbered_items = [content for _, content in index.steps]
+        else:
+            numbered_items = _NUMBERED_ITEM_RE.findall(text)
+        
+        self._count_matches(len(tech_terms) + len(quoted_terms) + len(bullet_points) + len(numbered_items))
         
         concepts = []
         concepts.extend([term for term in tech_terms if len(term) > 2])
@@ -42,13 +209,16 @@ class SmartCardGenerator:
         
         return unique_concepts[:10]  # 最大10個
     
-    def generate_definition_cards(self, concepts: List[str], context: str, topic: str) -> List[AnkiCard]:
+    def generate_definition_cards(self, concepts: List[str], context: str, topic: str,
+                                  index: Optional[SentenceIndex] = None) -> List[AnkiCard]:
         """概念の定義カードを生成"""
         cards = []
         
+        # コンテキストから全概念の定義をまとめて抽出
+        definitions = self._extract_definitions(concepts, context, index)
+        
         for concept in concepts:
-            # コンテキストから定義を抽出しようと試みる
-            definition = self._extract_definition(concept, context)
+            definition = definitions.get(concept, "")
             
             if definition and len(definition) > 20:
                 card = AnkiCard(
@@ -62,69 +232,108 @@ class SmartCardGenerator:
     
     def _extract_definition(self, concept: str, context: str) -> str:
         """コンテキストから概念の定義を抽出"""
-        # 概念の前後の文章を探す
-        patterns = [
-            rf"{re.escape(concept)}とは、([^。]+。)",
-            rf"{re.escape(concept)}は、([^。]+。)",
-            rf"{re.escape(concept)}：([^。\n]+)",
-            rf"{re.escape(concept)}\s*[-－]\s*([^。\n]+)"
-        ]
+        return self._extract_definitions([concept], context).get(concept, "")
+    
+    def _extract_definitions(self, concepts: List[str], context: str,
+                             index: Optional[SentenceIndex] = None) -> Dict[str, str]:
+        """
+        全概念の定義をまとめて抽出（概念ごとに本文を走査し直さない）
+        優先順位は従来と同じ: 定義パターンの順 → 同じパターンなら最初の出現
+        → どのパターンにも一致しなければ概念を含む最初の行（20文字超）
+        """
+        ordered = sorted({concept for concept in concepts if concept}, key=len, reverse=True)
+        if not ordered:
+            return {}
+        
+        # 1. 定義表現が直後に続く出現位置だけを1回の走査で探す
+        best: Dict[str, Tuple[int, str]] = {}  # 概念 → (パターンの優先順位, 定義)
+        finder, prefixes = _compile_term_finder(ordered, _DEFINITION_TAIL_PREFIX)
+        
+        matches = 0
+        for match in _iter_term_matches(finder, context):
+            matches += 1
+            start = match.start()
+            for concept in prefixes[match.group(1)]:
+                # まだ見つかっていない、より優先度の高いパターンだけを試す
+                limit = best[concept][0] if concept in best else len(_DEFINITION_TAIL_PATTERNS)
+                for priority in range(limit):
+                    tail = _DEFINITION_TAIL_PATTERNS[priority].match(context, start + len(concept))
+                    if tail:
+                        best[concept] = (priority, tail.group(1))
+                        break
         
-        for pattern in patterns:
-            match = re.search(pattern, context)
-            if match:
-                return f"{concept}は、{match.group(1)}"
+        self._count_matches(matches)
+        definitions = {concept: f"{concept}は、{best[concept][1]}" for concept in ordered if concept in best}
         
-        # パターンマッチに失敗した場合、概念を含む文を探す
-        sentences = re.split(r'[。．\n]', context)
-        for sentence in sentences:
-            if concept in sentence and len(sentence) > 20:
-                return sentence.strip() + "。"
+        # 2. 定義表現がなかった概念は、転置インデックスから概念を含む最初の行を使う
+        missing = [concept for concept in ordered if concept not in best]
+        if missing:
+            if index is None or index.text is not context:
+                index = SentenceIndex(context)
+            self._count_matches(index.index_terms(missing))
+            for concept in missing:
+                for line_index in index.lines_containing(concept):
+                    line = index.line(line_index)
+                    if len(line) > 20:
+                        definitions[concept] = line.strip() + "。"
+                        break
         
-        return ""
+        return definitions
     
-    def generate_comparison_cards(self, text: str, topic: str) -> List[AnkiCard]:
+    def generate_comparison_cards(self, text: str, topic: str,
+                                  index: Optional[SentenceIndex] = None) -> List[AnkiCard]:
         """比較・対比のカードを生成"""
         cards = []
         
         # "AとB"のような比較表現を探す
-        comparison_patterns = [
-            r'([^と\s]+)と([^と\s]+)の違い',
-            r'([^と\s]+)と([^と\s]+)を比較',
-            r'([^、\s]+)、([^、\s]+)の特徴'
-        ]
+        pairs = [match for pattern in _COMPARISON_PATTERNS for match in pattern.findall(text)]
+        self._count_matches(len(pairs))
+        if not pairs:
+            return cards
         
-        for pattern in comparison_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                item1, item2 = match
-                card = AnkiCard(
-                    front=f"{item1}と{item2}の違いは？",
-                    back=self._extract_comparison_text(item1, item2, text),
-                    tags=[topic, "比較", "対比"]
-                )
-                if len(card.back) > 20:
-                    cards.append(card)
+        # 比較対象の語句はまとめて1回の走査でインデックスに登録
+        if index is None or index.text is not text:
+            index = SentenceIndex(text)
+        self._count_matches(index.index_terms(item for pair in pairs for item in pair))
+        
+        for item1, item2 in pairs:
+            card = AnkiCard(
+                front=f"{item1}と{item2}の違いは？",
+                back=self._extract_comparison_text(item1, item2, text, index),
+                tags=[topic, "比較", "対比"]
+            )
+            if len(card.back) > 20:
+                cards.append(card)
         
         return cards
     
-    def _extract_comparison_text(self, item1: str, item2: str, text: str) -> str:
+    def _extract_comparison_text(self, item1: str, item2: str, text: str,
+                                 index: Optional[SentenceIndex] = None) -> str:
         """比較に関するテキストを抽出"""
-        sentences = re.split(r'[。．]', text)
+        if index is None or index.text is not text:
+            index = SentenceIndex(text)
+        
+        # どちらかの語句を含む文を、本文中の順に最大3文
+        sentence_ids = sorted(set(index.sentences_containing(item1)) | set(index.sentences_containing(item2)))
         comparison_text = []
         
-        for sentence in sentences:
-            if (item1 in sentence or item2 in sentence) and len(sentence) > 15:
+        for sentence_id in sentence_ids:
+            sentence = index.sentence(sentence_id)
+            if len(sentence) > 15:
                 comparison_text.append(sentence.strip())
+                if len(comparison_text) == 3:
+                    break
         
-        return "。".join(comparison_text[:3]) + "。"
+        return "。".join(comparison_text) + "。"
     
-    def generate_process_cards(self, text: str, topic: str) -> List[AnkiCard]:
+    def generate_process_cards(self, text: str, topic: str,
+                               index: Optional[SentenceIndex] = None) -> List[AnkiCard]:
         """手順・プロセスのカードを生成"""
         cards = []
         
         # 手順を表す表現を探す
-        steps = re.findall(r'(\d+)[\.．)\)]\s*([^\n]+)', text)
+        steps = index.steps if index is not None and index.text is text else _STEP_RE.findall(text)
+        self._count_matches(len(steps))
         
         if len(steps) >= 2:
             # 全体の手順を問うカード
@@ -150,13 +359,31 @@ class SmartCardGenerator:
     
     def generate_cards_from_llm_response(self, question: str, answer: str, topic: str = "") -> List[AnkiCard]:
         """LLMの質問と回答からAnkiカードを包括的に生成"""
+        if self.profiler is None:
+            return self._generate_cards(question, answer, topic, None)
+        
+        call = CallProfile(question, answer)
+        self._call = call
+        try:
+            cards = self._generate_cards(question, answer, topic, call)
+        finally:
+            self._call = None
+        self.profiler.record(call)
+        return cards
+    
+    def _generate_cards(self, question: str, answer: str, topic: str,
+                        call: Optional[CallProfile]) -> List[AnkiCard]:
+        """5つのステージを順に実行（callがあればステージごとに計測）"""
         cards = []
         
+        # 1. メインの質問回答カード
+        if call is not None:
+            call.begin("main")
+        
         # トピックが指定されていない場合、質問から推定
         if not topic:
             topic = self._infer_topic(question)
         
-        # 1. メインの質問回答カード
         main_card = AnkiCard(
             front=question,
             back=answer,
@@ -164,20 +391,40 @@ class SmartCardGenerator:
         )
         cards.append(main_card)
         
+        if call is not None:
+            call.end(1)
+            call.begin("definitions")
+        
+        # 回答の文分割と語句の転置インデックスは以降の全ステージで共有
+        index = SentenceIndex(answer)
+        
         # 2. 重要概念の定義カード
-        concepts = self.extract_key_concepts(answer)
-        definition_cards = self.generate_definition_cards(concepts, answer, topic)
+        concepts = self.extract_key_concepts(answer, index)
+        definition_cards = self.generate_definition_cards(concepts, answer, topic, index)
         cards.extend(definition_cards)
         
+        if call is not None:
+            call.end(len(definition_cards))
+            call.begin("comparisons")
+        
         # 3. 比較・対比カード
-        comparison_cards = self.generate_comparison_cards(answer, topic)
+        comparison_cards = self.generate_comparison_cards(answer, topic, index)
         cards.extend(comparison_cards)
         
+        if call is not None:
+            call.end(len(comparison_cards))
+            call.begin("processes")
+        
         # 4. 手順・プロセスカード
-        process_cards = self.generate_process_cards(answer, topic)
+        process_cards = self.generate_process_cards(answer, topic, index)
         cards.extend(process_cards)
         
+        if call is not None:
+            call.end(len(process_cards))
+            call.begin("reverse")
+        
         # 5. 逆方向カード（回答から質問を推測）
+        reverse_cards = 0
         if len(answer) < 200:  # 短い回答の場合のみ
             reverse_card = AnkiCard(
                 front=f"次の内容について質問してください：\n{answer[:100]}...",
@@ -185,18 +432,22 @@ class SmartCardGenerator:
                 tags=[topic, "逆方向", "質問推測"]
             )
             cards.append(reverse_card)
+            reverse_cards = 1
+        
+        if call is not None:
+            call.end(reverse_cards)
         
         return cards
     
     def _infer_topic(self, question: str) -> str:
         """質問からトピックを推定"""
         # 技術用語を探す
-        tech_terms = re.findall(r'[A-Za-z][A-Za-z0-9]*', question)
+        tech_terms = _TOPIC_TECH_TERM_RE.findall(question)
         if tech_terms:
             return tech_terms[0]
         
         # 日本語の重要語句
-        important_words = re.findall(r'([ァ-ヶー]+|[一-龯]+)', question)
+        important_words = _TOPIC_JAPANESE_WORD_RE.findall(question)
         if important_words:
             return important_words[0]
         
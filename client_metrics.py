@@ -0,0 +1,139 @@
+"""
+AnkiConnectクライアントのアクション別メトリクス
+呼び出し回数・エラー数・送受信バイト数・レイテンシのヒストグラム（p50/p95/p99）を集計する
+"""
+
+import bisect
+import threading
+from typing import Any, Dict, List, Optional
+
+# レイテンシのバケット上限（秒）: 0.1msから約1.5倍ずつ、最後は上限なし
+LATENCY_BUCKETS: List[float] = [round(0.0001 * 1.5 ** i, 7) for i in range(34)] + [float("inf")]
+
+
+class _ActionStats:
+    """1つのアクションの集計値"""
+
+    __slots__ = ("count", "errors", "bytes_sent", "bytes_received", "total_seconds",
+                 "max_seconds", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """ヒストグラムからq分位点を推定（バケット内は線形補間）"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.buckets):
+            if bucket_count and cumulative + bucket_count >= target:
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                upper = min(LATENCY_BUCKETS[index], self.max_seconds)
+                if upper <= lower:
+                    return upper
+                return lower + (upper - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.max_seconds
+
+
+class ClientMetrics:
+    """アクション別のメトリクスを集計するスレッドセーフなレコーダー"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._actions: Dict[str, _ActionStats] = {}
+
+    def record(self, action: str, seconds: float, bytes_sent: int, bytes_received: int,
+               error: bool) -> None:
+        """リクエスト1回分を記録"""
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            stats = self._actions.get(action)
+            if stats is None:
+                stats = self._actions[action] = _ActionStats()
+            stats.count += 1
+            stats.errors += error
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.total_seconds += seconds
+            if seconds > stats.max_seconds:
+                stats.max_seconds = seconds
+            stats.buckets[bucket] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._actions.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """アクション名 → 集計値の辞書（レイテンシは秒）"""
+        with self._lock:
+            actions = {action: self._copy(stats) for action, stats in self._actions.items()}
+
+        return {
+            action: {
+                "count": stats.count,
+                "errors": stats.errors,
+                "bytes_sent": stats.bytes_sent,
+                "bytes_received": stats.bytes_received,
+                "total_seconds": stats.total_seconds,
+                "mean_seconds": stats.total_seconds / stats.count if stats.count else None,
+                "max_seconds": stats.max_seconds,
+                "p50_seconds": stats.percentile(0.50),
+                "p95_seconds": stats.percentile(0.95),
+                "p99_seconds": stats.percentile(0.99),
+            }
+            for action, stats in sorted(actions.items())
+        }
+
+    def prometheus(self, prefix: str = "anki_connect") -> str:
+        """Prometheusのテキスト形式で出力"""
+        with self._lock:
+            actions = sorted((action, self._copy(stats)) for action, stats in self._actions.items())
+
+        lines: List[str] = []
+
+        def counter(name: str, help_text: str, attribute: str) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for action, stats in actions:
+                lines.append(f'{prefix}_{name}{{action="{_escape(action)}"}} {getattr(stats, attribute)}')
+
+        counter("requests_total", "AnkiConnect requests sent.", "count")
+        counter("request_errors_total", "AnkiConnect requests that failed.", "errors")
+        counter("sent_bytes_total", "Request body bytes sent.", "bytes_sent")
+        counter("received_bytes_total", "Response body bytes received.", "bytes_received")
+
+        name = f"{prefix}_request_duration_seconds"
+        lines.append(f"# HELP {name} AnkiConnect request latency.")
+        lines.append(f"# TYPE {name} histogram")
+        for action, stats in actions:
+            label = _escape(action)
+            cumulative = 0
+            for upper, bucket_count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += bucket_count
+                le = "+Inf" if upper == float("inf") else repr(upper)
+                lines.append(f'{name}_bucket{{action="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{action="{label}"}} {stats.total_seconds}')
+            lines.append(f'{name}_count{{action="{label}"}} {stats.count}')
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _copy(stats: _ActionStats) -> _ActionStats:
+        copied = _ActionStats()
+        for attribute in _ActionStats.__slots__:
+            value = getattr(stats, attribute)
+            setattr(copied, attribute, list(value) if attribute == "buckets" else value)
+        return copied
+
+
+def _escape(value: str) -> str:
+    """Prometheusのラベル値をエスケープ"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -3,90 +3,146 @@
 LLMの出力や既存のデータを直接Ankiに登録
 """
 
+from __future__ import annotations
+
+import io
+import itertools
 import json
+import os
 import re
-from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass
+from collections import deque
+from typing import (TYPE_CHECKING, List, Dict, Any, Optional, Sequence, Tuple, Iterable, Iterator, Set, TextIO,
+                    BinaryIO, Callable, Deque)
 from anki_client import AnkiConnectClient
+from anki_schema import ADD_NOTES_OVERHEAD, AnkiCard, encode_add_notes_request
+from import_checkpoint import ImportCheckpoint
 
-@dataclass
-class StructuredCard:
-    """構造化されたカードデータ"""
-    front: str
-    back: str
-    tags: List[str]
-    deck_name: str = "構造化学習"
-    
-    def to_anki_format(self) -> Dict[str, Any]:
-        """AnkiConnect形式に変換"""
-        return {
-            "deckName": self.deck_name,
-            "modelName": "基本",
-            "fields": {
-                "表面": self.front,
-                "裏面": self.back
-            },
-            "tags": self.tags
-        }
+if TYPE_CHECKING:
+    from card_batch import CardBatch
+    from duplicate_index import DuplicateIndex
+    from note_id_map import NoteIdMap
+    from note_outbox import NoteOutbox
+
+_TAG_SPLIT_RE = re.compile(r'[,\s]+')
+
+class StructuredCard(AnkiCard):
+    """
+    構造化されたカードデータ（ノートタイプ「基本」のAnkiCard）
+    従来の引数順 (front, back, tags, deck_name) で作成できるようにした薄いアダプター
+    """
+    __slots__ = ()
+    
+    def __init__(self, front: str, back: str, tags: Sequence[str], deck_name: str = "構造化学習"):
+        AnkiCard.__init__(self, front, back, deck_name, "基本", tags)
 
 class DirectCardImporter:
     """構造化データを直接Ankiにインポートするクラス"""
     
-    def __init__(self, default_deck: str = "構造化学習"):
-        self.anki_client = AnkiConnectClient()
+    # import_from_fileで進捗をチェックポイントに記録するか（ファイルに書き出すサブクラスはFalse）
+    checkpoint_files = True
+    
+    def __init__(self, default_deck: str = "構造化学習", duplicate_index: Optional[DuplicateIndex] = None,
+                 outbox: Optional[NoteOutbox] = None, anki_client: Optional[AnkiConnectClient] = None,
+                 note_ids: Optional[NoteIdMap] = None):
+        # 指定されている場合は既存のクライアント（コネクションプール）を共有する
+        self.anki_client = anki_client or AnkiConnectClient()
         self.default_deck = default_deck
+        # 指定されている場合、既知の重複カードは送信前に取り除く
+        self.duplicate_index = duplicate_index
+        # 指定されている場合、Ankiに接続できなくてもカードをアウトボックスに保存して続行する
+        self.outbox = outbox
+        # 指定されている場合、追加したノートIDを記録し、再インポートでは追加せずに内容が変わったものだけ更新する
+        self.note_ids = note_ids
+        self.offline = False
+        # 接続確認とデッキ作成は最初にAnkiを使うとき（connect）まで行わない
+        self._connected = False
+    
+    def connect(self) -> bool:
+        """
+        AnkiConnectへの接続を確認し、既定のデッキを用意する（2回目以降は何もしない）
+        接続できればTrue、アウトボックスに保存するオフラインモードになればFalseを返す
+        """
+        if self._connected:
+            return not self.offline
         
-        # 接続確認
-        if not self.anki_client.test_connection():
-            raise Exception("AnkiConnectに接続できません")
+        # deckNamesの結果はクライアントにキャッシュされ、デッキの確認でも使われる
+        try:
+            deck_names = self.anki_client.get_deck_names()
+        except Exception:
+            if self.outbox is None:
+                raise Exception("AnkiConnectに接続できません")
+            self.offline = True
+            self._connected = True
+            self.outbox.start()
+            print("📮 AnkiConnectに接続できないため、カードをアウトボックスに保存します")
+            return False
+        
+        self._connected = True
         
         # デッキ作成
-        if default_deck not in self.anki_client.get_deck_names():
-            self.anki_client.create_deck(default_deck)
+        if self.default_deck not in deck_names:
+            self.anki_client.create_deck(self.default_deck)
+        
+        # 前回オフライン時に溜まったカードを先に送信
+        if self.outbox is not None and len(self.outbox) > 0:
+            self.outbox.flush()
+        return True
     
     def parse_table_format(self, table_text: str, deck_name: str = None) -> List[StructuredCard]:
         """
         表形式のテキストからカードデータを解析
         形式: "表面 裏面 タグ" (タブ区切り、空白区切り、またはパイプ区切り)
         """
-        cards = []
-        lines = table_text.strip().split('\n')
-        
-        # ヘッダー行をスキップ
-        data_lines = [line for line in lines if line.strip() and not self._is_header_line(line)]
-        
-        for line in data_lines:
+        return list(self.iter_table_cards(io.StringIO(table_text.strip()), deck_name))
+    
+    def iter_table_cards(self, lines: Iterable[str], deck_name: str = None) -> Iterator[StructuredCard]:
+        """
+        行のイテラブル（開いたファイルなど）から1枚ずつカードを解析するジェネレータ
+        区切り文字の判定はparse_table_formatと同じ
+        """
+        for raw_line in lines:
+            line = raw_line.rstrip('\r\n')
+            
+            # 空行とヘッダー行をスキップ
+            if not line.strip() or self._is_header_line(line):
+                continue
+            
             try:
-                # 区切り文字を自動判定
-                if '\t' in line:
-                    parts = line.split('\t')
-                elif '|' in line:
-                    parts = [p.strip() for p in line.split('|') if p.strip()]
-                else:
-                    # 複雑な分割: 最初の()までが表面、最後の単語群がタグ、中間が裏面
-                    parts = self._smart_split_line(line)
-                
-                if len(parts) >= 3:
-                    front = parts[0].strip()
-                    back = parts[1].strip()
-                    tags_text = parts[2].strip()
-                    
-                    # タグを分割
-                    tags = [tag.strip() for tag in re.split(r'[,\s]+', tags_text) if tag.strip()]
-                    
-                    card = StructuredCard(
-                        front=front,
-                        back=back,
-                        tags=tags,
-                        deck_name=deck_name or self.default_deck
-                    )
-                    cards.append(card)
-                    
+                card = self._parse_table_line(line, deck_name)
             except Exception as e:
                 print(f"⚠️  行の解析に失敗: {line[:50]}... - {e}")
                 continue
+            
+            if card:
+                yield card
+    
+    def _parse_table_line(self, line: str, deck_name: str = None) -> Optional[StructuredCard]:
+        """表形式の1行をStructuredCardに変換（列が足りなければNone）"""
+        # 区切り文字を自動判定
+        if '\t' in line:
+            parts = line.split('\t')
+        elif '|' in line:
+            parts = [p.strip() for p in line.split('|') if p.strip()]
+        else:
+            # 複雑な分割: 最初の()までが表面、最後の単語群がタグ、中間が裏面
+            parts = self._smart_split_line(line)
+        
+        if len(parts) < 3:
+            return None
+        
+        front = parts[0].strip()
+        back = parts[1].strip()
+        tags_text = parts[2].strip()
         
-        return cards
+        # タグを分割
+        tags = [tag.strip() for tag in _TAG_SPLIT_RE.split(tags_text) if tag.strip()]
+        
+        return StructuredCard(
+            front=front,
+            back=back,
+            tags=tags,
+            deck_name=deck_name or self.default_deck
+        )
     
     def _is_header_line(self, line: str) -> bool:
         """ヘッダー行かどうかを判定"""
@@ -162,6 +218,25 @@ class DirectCardImporter:
             print(f"❌ JSON解析エラー: {e}")
             return []
     
+    def iter_json_cards(self, fp: TextIO, deck_name: str = None) -> Iterator[StructuredCard]:
+        """JSONLまたはJSON配列のファイルから1枚ずつカードを読み込むジェネレータ"""
+        from json_stream import iter_json_records
+        
+        for item in iter_json_records(fp):
+            if not isinstance(item, dict):
+                continue
+            card = self._create_card_from_dict(item, deck_name)
+            if card:
+                yield card
+    
+    def import_json_stream(self, fp: TextIO, deck_name: str = None, chunk_size: int = 500) -> Dict[str, Any]:
+        """JSONLまたはJSON配列のファイル（標準入力も可）を逐次インポート"""
+        try:
+            return self.import_card_stream(self.iter_json_cards(fp, deck_name), chunk_size)
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON解析エラー: {e}")
+            return {"success": False, "message": f"JSON解析エラー: {e}"}
+    
     def _create_card_from_dict(self, item: Dict, deck_name: str = None) -> Optional[StructuredCard]:
         """辞書からStructuredCardを作成"""
         try:
@@ -209,62 +284,352 @@ class DirectCardImporter:
         
         return None
     
-    def import_cards(self, cards: List[StructuredCard]) -> Dict[str, Any]:
-        """カードをAnkiにインポート"""
+    def import_cards(self, cards: List[AnkiCard], chunk_size: int = 500,
+                     max_chunk_bytes: int = 4 * 1024 * 1024) -> Dict[str, Any]:
+        """
+        カードをAnkiにインポート
+        カード数 (chunk_size) とペイロードサイズ (max_chunk_bytes) の両方で
+        チャンクに分割し、チャンクごとにaddNotesを1回送信する
+        """
         if not cards:
             return {"success": False, "message": "インポートするカードがありません"}
         
+        if not self.connect():
+            result = self._enqueue_cards(cards, chunk_size)
+            result.update(successful_cards=[], failed_cards=[], skipped_cards=[], updated_cards=[])
+            return result
+        
         # デッキを作成（必要に応じて）
         deck_names = set(card.deck_name for card in cards)
-        existing_decks = self.anki_client.get_deck_names()
-        
-        for deck_name in deck_names:
-            if deck_name not in existing_decks:
-                self.anki_client.create_deck(deck_name)
-                print(f"📂 デッキ '{deck_name}' を作成しました")
+        self._ensure_decks(deck_names, set(self.anki_client.get_deck_names()))
+        if self.duplicate_index is not None:
+            self.duplicate_index.ensure_seeded(self.anki_client, deck_names)
         
         # カードを追加
         successful_cards = []
         failed_cards = []
+        skipped_cards = []
+        updated_cards = []
+        processed = 0
         
-        for card in cards:
-            try:
-                note_data = {
-                    "deckName": card.deck_name,
-                    "modelName": "基本",
-                    "fields": {
-                        "表面": card.front,
-                        "裏面": card.back
-                    },
-                    "tags": card.tags
-                }
-                
-                note_id = self.anki_client._send_request("addNote", {"note": note_data})
-                
-                if note_id.get("result"):
-                    successful_cards.append(card)
-                    print(f"✅ カード追加: {card.front[:50]}...")
-                else:
-                    failed_cards.append(card)
-                    error = note_id.get("error", "不明なエラー")
-                    print(f"❌ カード追加失敗: {card.front[:50]}... - {error}")
-                
-            except Exception as e:
-                failed_cards.append(card)
-                print(f"❌ エラー: {card.front[:50]}... - {e}")
+        for chunk, notes in self._iter_note_chunks(cards, chunk_size, max_chunk_bytes):
+            added, failed, skipped, updated = self._import_chunk(chunk, notes)
+            successful_cards.extend(added)
+            failed_cards.extend(failed)
+            skipped_cards.extend(skipped)
+            updated_cards.extend(updated)
+            processed += len(chunk)
+            print(f"✅ {len(added)}/{len(chunk)}枚のカードを追加 (累計 {processed}/{len(cards)})")
+        
+        if updated_cards:
+            print(f"🔁 内容が変わった {len(updated_cards)}枚のノートを更新しました")
+        if skipped_cards:
+            print(f"⏭️  既知の重複 {len(skipped_cards)}枚は送信しませんでした")
         
         return {
             "success": True,
             "total_cards": len(cards),
             "successful": len(successful_cards),
             "failed": len(failed_cards),
+            "skipped": len(skipped_cards),
+            "updated": len(updated_cards),
             "successful_cards": successful_cards,
-            "failed_cards": failed_cards
+            "failed_cards": failed_cards,
+            "skipped_cards": skipped_cards,
+            "updated_cards": updated_cards
+        }
+    
+    def import_card_stream(self, cards: Iterable[AnkiCard], chunk_size: int = 500,
+                           max_chunk_bytes: int = 4 * 1024 * 1024,
+                           on_chunk: Optional[Callable[[int, int, int, int, int], None]] = None) -> Dict[str, Any]:
+        """
+        カードのイテレータを読みながらチャンク単位でインポート
+        カードを保持しないため、入力の大きさに関係なくメモリ使用量は一定
+        on_chunkはチャンクを送信するたびに (カード数, 追加, 失敗, 送信しなかった, 更新) の枚数で呼ばれる
+        """
+        if not self.connect():
+            return self._enqueue_cards(cards, chunk_size)
+        
+        known_decks = set(self.anki_client.get_deck_names())
+        total = 0
+        successful = 0
+        skipped = 0
+        updated = 0
+        
+        for chunk, notes in self._iter_note_chunks(cards, chunk_size, max_chunk_bytes):
+            deck_names = set(card.deck_name for card in chunk)
+            self._ensure_decks(deck_names, known_decks)
+            if self.duplicate_index is not None:
+                self.duplicate_index.ensure_seeded(self.anki_client, deck_names)
+            
+            added, failed, duplicates, changed = self._import_chunk(chunk, notes)
+            total += len(chunk)
+            successful += len(added)
+            skipped += len(duplicates)
+            updated += len(changed)
+            print(f"✅ {len(added)}/{len(chunk)}枚のカードを追加 (累計 {successful}/{total})")
+            if on_chunk is not None:
+                on_chunk(len(chunk), len(added), len(failed), len(duplicates), len(changed))
+        
+        if total == 0:
+            return {"success": False, "message": "インポートするカードがありません"}
+        
+        return {
+            "success": True,
+            "total_cards": total,
+            "successful": successful,
+            "failed": total - successful - skipped - updated,
+            "skipped": skipped,
+            "updated": updated
         }
     
-    def import_from_text(self, text_data: str, deck_name: str = None, format_type: str = "auto") -> Dict[str, Any]:
-        """テキストデータから直接インポート"""
+    def import_card_batch(self, batch: CardBatch, chunk_size: int = 500,
+                          max_chunk_bytes: int = 4 * 1024 * 1024) -> Dict[str, Any]:
+        """
+        CardBatchをインポート（戻り値はimport_card_streamと同じ形式）
+        列から直接addNotesの本文を作るため、カードごとの辞書を作らない
+        """
+        if len(batch) == 0:
+            return {"success": False, "message": "インポートするカードがありません"}
+        
+        if not self.connect():
+            return self._enqueue_cards(batch, chunk_size)
+        
+        if self.note_ids is not None:
+            # 記録済みのカードの判定はカード単位で行う
+            return self.import_card_stream(iter(batch), chunk_size, max_chunk_bytes)
+        
+        deck_names = batch.deck_names()
+        self._ensure_decks(deck_names, set(self.anki_client.get_deck_names()))
         
+        indices: Optional[List[int]] = None
+        fingerprints: Dict[int, bytes] = {}
+        if self.duplicate_index is not None:
+            # 既知の重複はネットワークに送る前に取り除く
+            self.duplicate_index.ensure_seeded(self.anki_client, deck_names)
+            fingerprints = dict(self.duplicate_index.split_card_batch(batch))
+            indices = list(fingerprints)
+        
+        total = len(batch)
+        skipped = total - len(indices) if indices is not None else 0
+        successful = 0
+        added_fingerprints = []
+        
+        for chunk, body in batch.iter_add_notes_requests(indices, chunk_size, max_chunk_bytes):
+            try:
+                note_ids = self.anki_client._send_encoded("addNotes", body).get("result") or []
+            except Exception as e:
+                print(f"⚠️  addNotesに失敗したため1枚ずつ再送します: {e}")
+                note_ids = self._send_one_by_one([batch.card(i) for i in chunk])
+            
+            if len(note_ids) != len(chunk):
+                print(f"⚠️  addNotesの結果数が一致しません ({len(note_ids)}/{len(chunk)})")
+                note_ids = [None] * len(chunk)
+            
+            added = sum(1 for note_id in note_ids if note_id)
+            successful += added
+            added_fingerprints.extend(
+                (fingerprints[i], batch.deck_name(i))
+                for i, note_id in zip(chunk, note_ids) if note_id and i in fingerprints
+            )
+            print(f"✅ {added}/{len(chunk)}枚のカードを追加 (累計 {successful}/{total})")
+        
+        if added_fingerprints:
+            self.duplicate_index.add_many(added_fingerprints)
+        if skipped:
+            print(f"⏭️  既知の重複 {skipped}枚は送信しませんでした")
+        
+        return {
+            "success": True,
+            "total_cards": total,
+            "successful": successful,
+            "failed": total - successful - skipped,
+            "skipped": skipped
+        }
+    
+    def _enqueue_cards(self, cards: Iterable[AnkiCard], chunk_size: int) -> Dict[str, Any]:
+        """オフライン時: カードをchunk_size枚ずつアウトボックスに書き込む"""
+        total = 0
+        chunk: List[AnkiCard] = []
+        for card in cards:
+            chunk.append(card)
+            if len(chunk) >= chunk_size:
+                total += self.outbox.enqueue(chunk)
+                chunk = []
+        if chunk:
+            total += self.outbox.enqueue(chunk)
+        
+        if total == 0:
+            return {"success": False, "message": "インポートするカードがありません"}
+        
+        print(f"📮 {total}枚のカードをアウトボックスに保存しました（Ankiに接続でき次第送信します）")
+        return {
+            "success": True,
+            "total_cards": total,
+            "successful": 0,
+            "failed": 0,
+            "skipped": 0,
+            "queued": total
+        }
+    
+    def _ensure_decks(self, deck_names: Iterable[str], known_decks: Set[str]) -> None:
+        """存在しないデッキをmultiリクエスト1回でまとめて作成（known_decksを更新）"""
+        with self.anki_client.batch() as batch:
+            created = {
+                deck_name: batch.add("createDeck", {"deck": deck_name})
+                for deck_name in deck_names
+                if deck_name not in known_decks
+            }
+        
+        for deck_name, pending in created.items():
+            if pending.ok:
+                known_decks.add(deck_name)
+                print(f"📂 デッキ '{deck_name}' を作成しました")
+            else:
+                print(f"⚠️  デッキ '{deck_name}' の作成に失敗: {pending.error}")
+    
+    def _iter_note_chunks(self, cards: Iterable[AnkiCard], chunk_size: int,
+                          max_chunk_bytes: int) -> Iterator[Tuple[List[AnkiCard], List[str]]]:
+        """
+        カード数とJSONペイロードのバイト数の両方を上限としてチャンクに分割
+        ノートは辞書を作らずにJSON文字列へ直接エンコードする
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size は1以上を指定してください")
+        
+        chunk: List[AnkiCard] = []
+        notes: List[str] = []
+        chunk_bytes = ADD_NOTES_OVERHEAD
+        
+        for card in cards:
+            note = card.encode_note()
+            # ASCIIでエンコードしているので文字数 = バイト数（区切りの ", " を含む）
+            note_bytes = len(note) + 2
+            
+            if chunk and (len(chunk) >= chunk_size or chunk_bytes + note_bytes > max_chunk_bytes):
+                yield chunk, notes
+                chunk, notes, chunk_bytes = [], [], ADD_NOTES_OVERHEAD
+            
+            chunk.append(card)
+            notes.append(note)
+            chunk_bytes += note_bytes
+        
+        if chunk:
+            yield chunk, notes
+    
+    def _import_chunk(self, chunk: List[AnkiCard], notes: List[str]
+                      ) -> Tuple[List[AnkiCard], List[AnkiCard], List[AnkiCard], List[AnkiCard]]:
+        """
+        1チャンクをaddNotesで送信し、結果のノートIDをカードに対応付ける
+        戻り値は (追加できたカード, 失敗したカード, 送信しなかったカード, 既存のノートを更新したカード)
+        失敗したカードには、既存のノートの更新に失敗したカードも含む
+        送信しなかったカードは、既知の重複と、ノートIDの記録があり内容も変わっていないカード
+        """
+        skipped: List[AnkiCard] = []
+        updated: List[AnkiCard] = []
+        failed_updates: List[AnkiCard] = []
+        fingerprints: List[Optional[bytes]] = []
+        
+        if self.note_ids is not None:
+            # 以前に追加したカードは追加せず、内容が変わっていればupdateNoteFieldsで更新する
+            known, changed, rejected = self.note_ids.reconcile(self.anki_client, chunk)
+            if any(note_id is not None for note_id in known):
+                updated = [chunk[i] for i in sorted(changed)]
+                failed_updates = [chunk[i] for i in sorted(rejected)]
+                skipped = [card for i, (card, note_id) in enumerate(zip(chunk, known))
+                           if note_id is not None and i not in changed and i not in rejected]
+                chunk = [card for card, note_id in zip(chunk, known) if note_id is None]
+                notes = [note for note, note_id in zip(notes, known) if note_id is None]
+            if not chunk:
+                return [], failed_updates, skipped, updated
+        
+        if self.duplicate_index is not None:
+            # 既知の重複はネットワークに送る前に取り除く
+            fingerprints = self.duplicate_index.split_cards(chunk)
+            duplicates = [card for card, fp in zip(chunk, fingerprints) if fp is None]
+            if duplicates:
+                skipped.extend(duplicates)
+                chunk = [card for card, fp in zip(chunk, fingerprints) if fp is not None]
+                notes = [note for note, fp in zip(notes, fingerprints) if fp is not None]
+                fingerprints = [fp for fp in fingerprints if fp is not None]
+            if not chunk:
+                return [], failed_updates, skipped, updated
+        
+        note_ids = self._send_chunk(chunk, notes)
+        
+        added = []
+        failed = failed_updates
+        for card, note_id in zip(chunk, note_ids):
+            if note_id:
+                added.append(card)
+            else:
+                failed.append(card)
+        
+        if self.duplicate_index is not None:
+            self.duplicate_index.add_many(
+                (fp, card.deck_name) for fp, card, note_id in zip(fingerprints, chunk, note_ids) if note_id
+            )
+        if self.note_ids is not None:
+            self.note_ids.record_added(chunk, note_ids)
+        
+        return added, failed, skipped, updated
+    
+    def _send_chunk(self, chunk: List[AnkiCard], notes: List[str]) -> List[Optional[int]]:
+        """addNotesを送信し、カードと同じ順のノートID（失敗はNone）を返す"""
+        try:
+            body = encode_add_notes_request(notes)
+            note_ids = self.anki_client._send_encoded("addNotes", body).get("result") or []
+        except Exception as e:
+            # チャンク全体がエラーになった場合は1枚ずつ送り直して失敗したカードを特定
+            print(f"⚠️  addNotesに失敗したため1枚ずつ再送します: {e}")
+            return self._send_one_by_one(chunk)
+        
+        if len(note_ids) != len(chunk):
+            print(f"⚠️  addNotesの結果数が一致しません ({len(note_ids)}/{len(chunk)})")
+            return [None] * len(chunk)
+        
+        for card, note_id in zip(chunk, note_ids):
+            # 追加できなかったノートはIDがnullで返る
+            if not note_id:
+                print(f"❌ カード追加失敗: {card.front[:50]}... - 重複または無効なノート")
+        
+        return note_ids
+    
+    def _send_one_by_one(self, chunk: List[AnkiCard]) -> List[Optional[int]]:
+        """チャンク内のカードを1枚ずつaddNoteで送信"""
+        note_ids: List[Optional[int]] = []
+        for card in chunk:
+            try:
+                note_id = self.anki_client._send_request("addNote", {"note": card.to_anki_format()}).get("result")
+                if not note_id:
+                    print(f"❌ カード追加失敗: {card.front[:50]}... - 不明なエラー")
+                note_ids.append(note_id)
+            except Exception as e:
+                note_ids.append(None)
+                print(f"❌ エラー: {card.front[:50]}... - {e}")
+        
+        return note_ids
+    
+    def import_from_text(self, text_data: str, deck_name: str = None, format_type: str = "auto",
+                         resume: bool = False) -> Dict[str, Any]:
+        """
+        テキストデータから直接インポート
+        text_dataに既存ファイルのパスを渡した場合はファイルを逐次読み込む
+        （resume=Trueなら前回中断した位置から再開する。import_from_fileを参照）
+        """
+        if self._is_file_path(text_data):
+            return self.import_from_file(text_data, deck_name, format_type, resume=resume)
+        
+        cards = self.parse_text(text_data, deck_name, format_type)
+        print(f"📊 解析結果: {len(cards)}枚のカードを検出")
+        
+        if cards:
+            return self.import_cards(cards)
+        else:
+            return {"success": False, "message": "有効なカードデータが見つかりませんでした"}
+    
+    def parse_text(self, text_data: str, deck_name: str = None, format_type: str = "auto") -> List[StructuredCard]:
+        """テキストデータを形式（"auto", "table", "json"）に従って解析する"""
         if format_type == "auto":
             # 形式を自動判定
             if text_data.strip().startswith('{') or text_data.strip().startswith('['):
@@ -273,16 +638,105 @@ class DirectCardImporter:
                 format_type = "table"
         
         if format_type == "json":
-            cards = self.parse_json_format(text_data, deck_name)
-        else:  # table
-            cards = self.parse_table_format(text_data, deck_name)
-        
-        print(f"📊 解析結果: {len(cards)}枚のカードを検出")
+            return self.parse_json_format(text_data, deck_name)
+        return self.parse_table_format(text_data, deck_name)
+    
+    def import_from_file(self, path: str, deck_name: str = None, format_type: str = "auto",
+                         resume: bool = False, chunk_size: int = 500) -> Dict[str, Any]:
+        """
+        ファイル全体を読み込まず、行ごとに解析しながらインポート
+        チャンクを送信するたびに進捗を<path>.anki-checkpoint.jsonに記録し（完了したら削除）、
+        resume=Trueなら記録された位置から再開する。表形式はバイトオフセットまでseekし、
+        JSONは送信済みの件数だけ解析して読み飛ばす（どちらも送信済みのカードは再送しない）
+        """
+        with open(path, "rb") as fp:
+            if format_type == "auto":
+                # 最初の空白以外の文字で形式を判定（1行が巨大なJSONでも一定量ずつしか読まない）
+                head = b""
+                while not head:
+                    block = fp.read(4096)
+                    if not block:
+                        break
+                    head = block.lstrip()
+                format_type = "json" if head[:1] in (b'{', b'[') else "table"
+                fp.seek(0)
+            
+            checkpoint = ImportCheckpoint(path, deck_name or self.default_deck, format_type)
+            state = checkpoint.load() if resume and self.checkpoint_files else None
+            progress = {"cards": 0, "successful": 0, "failed": 0, "skipped": 0, "updated": 0}
+            if state:
+                progress = {key: state.get(key, 0) for key in progress}
+                print(f"⏩ チェックポイントから再開します（{progress['cards']}枚は送信済み）")
+            previous = dict(progress)
+            
+            # 表形式: 読み込んだカードの行末のバイトオフセット（送信済みのチャンクの分だけ取り出す）
+            positions: Deque[int] = deque()
+            if format_type == "json":
+                cards = self.iter_json_cards(io.TextIOWrapper(fp, encoding="utf-8"), deck_name)
+                cards = itertools.islice(cards, progress["cards"], None)
+            else:
+                fp.seek(state["offset"] if state else 0)
+                cards = self._iter_file_table_cards(fp, deck_name, positions)
+            
+            def on_chunk(count: int, added: int, failed: int, skipped: int, updated: int) -> None:
+                # Ankiが落ちて全件失敗したチャンクは記録せずに止める（再開時に送り直す）
+                if failed and not added and not updated and not self.anki_client.test_connection():
+                    raise Exception("AnkiConnectとの接続が切れました（resume=Trueで続きから再開できます）")
+                progress["cards"] += count
+                progress["successful"] += added
+                progress["failed"] += failed
+                progress["skipped"] += skipped
+                progress["updated"] += updated
+                offset = None
+                for _ in range(min(count, len(positions))):
+                    offset = positions.popleft()
+                checkpoint.save(offset, **progress)
+            
+            try:
+                result = self.import_card_stream(cards, chunk_size,
+                                                 on_chunk=on_chunk if self.checkpoint_files else None)
+            except json.JSONDecodeError as e:
+                print(f"❌ JSON解析エラー: {e}")
+                return {"success": False, "message": f"JSON解析エラー: {e}"}
         
-        if cards:
-            return self.import_cards(cards)
-        else:
+        if not result.get("success") and not state:
             return {"success": False, "message": "有効なカードデータが見つかりませんでした"}
+        
+        # アウトボックスに保存した場合も含め、最後まで処理できたので記録を削除
+        if self.checkpoint_files:
+            checkpoint.clear()
+        if not state:
+            return result
+        
+        # 前回までの件数と合算して返す
+        if not result.get("success"):
+            result = {"success": True, "total_cards": 0, "successful": 0, "failed": 0, "skipped": 0, "updated": 0}
+        result["total_cards"] += previous["cards"]
+        for key in ("successful", "failed", "skipped", "updated"):
+            result[key] = result.get(key, 0) + previous[key]
+        result["resumed_from"] = previous["cards"]
+        return result
+    
+    def _iter_file_table_cards(self, fp: BinaryIO, deck_name: Optional[str],
+                               positions: Deque[int]) -> Iterator[StructuredCard]:
+        """
+        バイナリモードで開いたファイルの現在位置から表形式のカードを読み込む
+        カードを返すたびに、その行末のバイトオフセットをpositionsに追加する
+        """
+        offset = fp.tell()
+        for raw_line in fp:
+            offset += len(raw_line)
+            for card in self.iter_table_cards((raw_line.decode("utf-8"),), deck_name):
+                positions.append(offset)
+                yield card
+    
+    @staticmethod
+    def _is_file_path(text_data: str) -> bool:
+        """テキストではなく既存ファイルへのパスかどうか"""
+        if isinstance(text_data, os.PathLike):
+            return True
+        return ('\n' not in text_data and len(text_data) < 4096
+                and os.path.isfile(text_data))
 
 # 使用例とテスト関数
 def test_immigration_data():
@@ -0,0 +1,228 @@
+"""
+アップロード前の重複判定用ローカルインデックス
+(デッキ, ノートタイプ, 正規化した表面) のハッシュをディスクに保存し、
+Ankiに送る前に既知の重複カードを取り除く
+Anki側での削除に追従するため、デッキごとの取り込みはseed_ttl秒で期限切れになり、
+次に使うときにAnkiから取り込み直す（deleteDecksを送ったデッキはすぐに消す）
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+DEFAULT_INDEX_PATH = os.path.join(".anki_cache", "duplicate_index.sqlite3")
+# デッキを取り込み直すまでの秒数
+DEFAULT_SEED_TTL = 600.0
+
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# SQLiteの1文あたりのプレースホルダー数の上限（古いバージョンは999）
+_SQL_BATCH = 500
+
+
+def normalize_front(text: str) -> str:
+    """表面の文字列を比較用に正規化（HTMLタグ除去・空白の統一）"""
+    text = unicodedata.normalize("NFC", text)
+    text = _HTML_TAG_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def fingerprint(deck_name: str, model_name: str, front: str) -> bytes:
+    """(デッキ, ノートタイプ, 正規化した表面) のハッシュ"""
+    key = "\x1f".join((deck_name, model_name, normalize_front(front)))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+def note_fingerprint(note: Dict[str, Any]) -> bytes:
+    """AnkiConnect形式のノート（addNote / addNotes のnote）のハッシュ"""
+    front = next(iter(note.get("fields", {}).values()), "")
+    return fingerprint(note.get("deckName", ""), note.get("modelName", ""), front)
+
+
+def _deck_query(deck_name: str) -> str:
+    """サブデッキを含まない、指定デッキだけを対象にした検索クエリ"""
+    escaped = re.sub(r'([\\"*_])', r'\\\1', deck_name)
+    return f'"deck:{escaped}" -"deck:{escaped}::*"'
+
+
+class DuplicateIndex:
+    """
+    既にAnkiに存在するノートのハッシュを、デッキ名と一緒に保持するSQLiteインデックス
+    seed_ttl: デッキをAnkiから取り込み直すまでの秒数（Noneなら期限なし、0ならインスタンスごとに取り込む）
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, seed_ttl: Optional[float] = DEFAULT_SEED_TTL):
+        self.path = path
+        self.seed_ttl = seed_ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(fingerprints)")]
+            if columns and "deck" not in columns:
+                # デッキ名を持たない古い形式。キャッシュなので作り直してAnkiから取り込み直す
+                self._conn.execute("DROP TABLE fingerprints")
+                self._conn.execute("DROP TABLE IF EXISTS seeded_decks")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints (fp BLOB PRIMARY KEY, deck TEXT NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS fingerprints_deck ON fingerprints (deck)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS seeded_decks (deck TEXT PRIMARY KEY, seeded_at REAL NOT NULL)"
+            )
+        # デッキ名 → 取り込んだ時刻（このインスタンスでは seed_ttl=0 でも1回は使う）
+        self._seeded: Dict[str, float] = {}
+        if seed_ttl != 0:
+            self._seeded = dict(self._conn.execute("SELECT deck, seeded_at FROM seeded_decks"))
+
+    @classmethod
+    def open_existing(cls, path: str = DEFAULT_INDEX_PATH) -> Optional["DuplicateIndex"]:
+        """インデックスのファイルがあれば開く（なければNone。削除スクリプトなどで使う）"""
+        return cls(path) if os.path.exists(path) else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+    def contains_many(self, fingerprints: Iterable[bytes]) -> Set[bytes]:
+        """渡されたハッシュのうち、インデックスに登録済みのものを返す"""
+        fingerprints = list(fingerprints)
+        found: Set[bytes] = set()
+        with self._lock:
+            for start in range(0, len(fingerprints), _SQL_BATCH):
+                batch = fingerprints[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(
+                    row[0] for row in self._conn.execute(
+                        f"SELECT fp FROM fingerprints WHERE fp IN ({placeholders})", batch
+                    )
+                )
+        return found
+
+    def add_many(self, entries: Iterable[Tuple[bytes, str]]) -> None:
+        """(ハッシュ, デッキ名) をまとめて登録"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO fingerprints (fp, deck) VALUES (?, ?)",
+                entries,
+            )
+
+    def is_seeded(self, deck_name: str) -> bool:
+        """デッキを取り込み済みで、まだ期限切れでないか"""
+        seeded_at = self._seeded.get(deck_name)
+        if seeded_at is None:
+            return False
+        return not self.seed_ttl or time.time() - seeded_at < self.seed_ttl
+
+    def forget_decks(self, deck_names: Iterable[str]) -> None:
+        """
+        削除したデッキ（子デッキを含む）のハッシュと取り込み済みの記録を消す
+        次にそのデッキを使うときはAnkiから取り込み直す
+        """
+        deck_names = list(deck_names)
+        matches = "deck = ? OR substr(deck, 1, length(?) + 2) = ? || '::'"
+        with self._lock, self._conn:
+            for name in deck_names:
+                self._conn.execute(f"DELETE FROM fingerprints WHERE {matches}", (name, name, name))
+                self._conn.execute(f"DELETE FROM seeded_decks WHERE {matches}", (name, name, name))
+        for deck in list(self._seeded):
+            if any(deck == name or deck.startswith(name + "::") for name in deck_names):
+                del self._seeded[deck]
+
+    def seed_from_anki(self, client, deck_names: Iterable[str], batch_size: int = 500) -> int:
+        """
+        findNotes / notesInfo で既存ノートを一括取得してインデックスに登録
+        notesInfoはデッキ名を返さないため、デッキごとに検索する
+        取り込み直す場合は、そのデッキの登録済みのハッシュをAnkiの現在の内容で置き換える
+        """
+        added = 0
+        for deck_name in deck_names:
+            note_ids = client._send_request("findNotes", {"query": _deck_query(deck_name)}).get("result") or []
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM fingerprints WHERE deck = ?", (deck_name,))
+
+            for start in range(0, len(note_ids), batch_size):
+                infos = client._send_request(
+                    "notesInfo", {"notes": note_ids[start:start + batch_size]}
+                ).get("result") or []
+                fingerprints = []
+                for info in infos:
+                    if not info:
+                        continue
+                    fields = sorted(info.get("fields", {}).values(), key=lambda field: field.get("order", 0))
+                    front = fields[0].get("value", "") if fields else ""
+                    fingerprints.append((fingerprint(deck_name, info.get("modelName", ""), front), deck_name))
+                self.add_many(fingerprints)
+                added += len(fingerprints)
+
+            seeded_at = time.time()
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO seeded_decks (deck, seeded_at) VALUES (?, ?)",
+                    (deck_name, seeded_at),
+                )
+            self._seeded[deck_name] = seeded_at
+
+        return added
+
+    def ensure_seeded(self, client, deck_names: Iterable[str]) -> int:
+        """まだ取り込んでいないデッキ・取り込みが期限切れのデッキだけをAnkiから取り込む"""
+        return self.seed_from_anki(client, [deck for deck in deck_names if not self.is_seeded(deck)])
+
+    def split_notes(self, notes: List[Dict[str, Any]]) -> List[Optional[bytes]]:
+        """
+        各ノートのハッシュを返す。既知の重複（インデックス登録済み、または
+        同じリスト内で前に同じノートがあるもの）はNoneにする
+        """
+        return self._split([note_fingerprint(note) for note in notes])
+
+    def split_cards(self, cards: Sequence[Any]) -> List[Optional[bytes]]:
+        """split_notesのAnkiCard版（ノートの辞書を作らずにカードの属性から直接ハッシュを計算する）"""
+        return self._split([fingerprint(card.deck_name, card.model_name, card.front) for card in cards])
+
+    def _split(self, fingerprints: List[bytes]) -> List[Optional[bytes]]:
+        known = self.contains_many(fingerprints)
+        result: List[Optional[bytes]] = []
+        for fp in fingerprints:
+            if fp in known:
+                result.append(None)
+            else:
+                known.add(fp)
+                result.append(fp)
+        return result
+
+    def split_card_batch(self, batch) -> List[Tuple[int, bytes]]:
+        """
+        CardBatchのうち既知の重複でないカードの (添字, ハッシュ) を返す
+        ノートの辞書を作らずに列から直接ハッシュを計算する
+        """
+        fingerprints = [
+            fingerprint(batch.deck_name(i), batch.model_name(i), batch.fronts[i]) for i in range(len(batch))
+        ]
+        known = self.contains_many(fingerprints)
+        result: List[Tuple[int, bytes]] = []
+        for index, fp in enumerate(fingerprints):
+            if fp not in known:
+                known.add(fp)
+                result.append((index, fp))
+        return result
+
+    def clear(self) -> None:
+        """インデックスを空にする（Anki側でノートを削除した場合などに使う）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM fingerprints")
+            self._conn.execute("DELETE FROM seeded_decks")
+        self._seeded.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
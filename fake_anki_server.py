@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク用のインプロセス疑似AnkiConnectサーバー
+本物のAnkiを起動せずにクライアントのスループットを計測するためのもの
+"""
+
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+class _FakeAnkiHandler(BaseHTTPRequestHandler):
+    """AnkiConnectのJSONプロトコルを模倣するリクエストハンドラ"""
+
+    # keep-aliveを有効にするためHTTP/1.1で応答する
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # ヘッダーと本文の分割送信でNagleの遅延が発生しないようにする
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        state: "FakeAnkiConnectServer" = self.server.fake_state
+
+        try:
+            request = json.loads(body.decode("utf-8"))
+            result = state.dispatch(request.get("action"), request.get("params") or {})
+            reply = {"result": result, "error": None}
+        except Exception as e:
+            reply = {"result": None, "error": str(e)}
+
+        payload = json.dumps(reply).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        """アクセスログは出力しない"""
+        pass
+
+
+class FakeAnkiConnectServer:
+    """ローカルポートで待ち受ける疑似AnkiConnectサーバー"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, per_note_cost: float = 0.0, store_notes: bool = True):
+        self.latency = latency              # リクエストごとの遅延（秒）
+        self.per_note_cost = per_note_cost  # ノート1件ごとの追加遅延（秒）
+        # Falseの場合はノートを保持しない（重複判定もしない）。大量投入のベンチマークでメモリを増やさないため
+        self.store_notes = store_notes
+        self.request_count = 0
+        self.notes_added = 0
+        self.action_counts: Dict[str, int] = {}
+        self.decks: List[str] = ["デフォルト"]
+        self.models: List[str] = ["基本"]
+        self.notes: Dict[int, Dict[str, Any]] = {}
+
+        self._lock = threading.Lock()
+        self._next_note_id = 1_000_000_000_000
+        self._fronts = set()
+        self._httpd = ThreadingHTTPServer((host, port), _FakeAnkiHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake_state = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeAnkiConnectServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeAnkiConnectServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        """リクエスト数・追加ノート数のカウンターを0に戻す"""
+        with self._lock:
+            self.request_count = 0
+            self.notes_added = 0
+            self.action_counts = {}
+
+    def dispatch(self, action: str, params: Dict[str, Any]) -> Any:
+        """アクションを処理して結果を返す"""
+        with self._lock:
+            self.request_count += 1
+            self.action_counts[action] = self.action_counts.get(action, 0) + 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        handler = getattr(self, f"_action_{action}", None)
+        if handler is None:
+            raise Exception(f"unsupported action: {action}")
+        return handler(params)
+
+    def _check_note(self, note: Dict[str, Any]) -> tuple:
+        """追加できないノートなら例外を送出し、重複判定用のキーを返す（ロック内で呼ぶ）"""
+        fields = note.get("fields", {})
+        if not fields or not next(iter(fields.values())):
+            raise Exception("cannot create note because it is empty")
+        if note.get("deckName") not in self.decks:
+            raise Exception(f"deck was not found: {note.get('deckName')}")
+
+        # Ankiと同様に、同じデッキ・ノートタイプで表面が同じノートは重複として拒否する
+        duplicate_key = (note.get("deckName"), note.get("modelName"), next(iter(fields.values())))
+        allow_duplicate = (note.get("options") or {}).get("allowDuplicate", False)
+        if duplicate_key in self._fronts and not allow_duplicate:
+            raise Exception("cannot create note because it is a duplicate")
+        return duplicate_key
+
+    def _insert_note(self, note: Dict[str, Any]) -> int:
+        if self.per_note_cost:
+            time.sleep(self.per_note_cost)
+
+        with self._lock:
+            duplicate_key = self._check_note(note)
+            note_id = self._next_note_id
+            self._next_note_id += 1
+            self.notes_added += 1
+            if self.store_notes:
+                self.notes[note_id] = note
+                self._fronts.add(duplicate_key)
+        return note_id
+
+    def _action_version(self, params):
+        return 6
+
+    def _action_deckNames(self, params):
+        with self._lock:
+            return list(self.decks)
+
+    def _action_modelNames(self, params):
+        return list(self.models)
+
+    def _action_createDeck(self, params):
+        parts = params["deck"].split("::")
+        with self._lock:
+            # 「親::子」形式では親デッキも作成される
+            for depth in range(1, len(parts) + 1):
+                name = "::".join(parts[:depth])
+                if name not in self.decks:
+                    self.decks.append(name)
+            return self.decks.index(params["deck"]) + 1
+
+    def _action_deleteDecks(self, params):
+        deleted = params.get("decks", [])
+        with self._lock:
+            self.decks = [
+                d for d in self.decks
+                if not any(d == name or d.startswith(name + "::") for name in deleted)
+            ]
+        return None
+
+    def _action_addNote(self, params):
+        return self._insert_note(params["note"])
+
+    def _action_addNotes(self, params):
+        note_ids = []
+        for note in params.get("notes", []):
+            try:
+                note_ids.append(self._insert_note(note))
+            except Exception:
+                note_ids.append(None)
+        return note_ids
+
+    def _action_updateNoteFields(self, params):
+        note_id = params["note"]["id"]
+        fields = params["note"].get("fields", {})
+        with self._lock:
+            note = self.notes.get(note_id)
+            if note is None:
+                if self.store_notes or note_id >= self._next_note_id:
+                    raise Exception(f"note was not found: {note_id}")
+                return None
+            old_key = (note.get("deckName"), note.get("modelName"), next(iter(note["fields"].values())))
+            note["fields"] = {**note["fields"], **fields}
+            self._fronts.discard(old_key)
+            self._fronts.add((note.get("deckName"), note.get("modelName"), next(iter(note["fields"].values()))))
+        return None
+
+    def _action_canAddNotes(self, params):
+        results = []
+        with self._lock:
+            for note in params.get("notes", []):
+                try:
+                    self._check_note(note)
+                    results.append(True)
+                except Exception:
+                    results.append(False)
+        return results
+
+    def _action_findNotes(self, params):
+        # ベンチマークで使う "deck:名前" 形式の検索だけに対応
+        match = re.match(r'"deck:((?:[^"\\]|\\.)*)"', params.get("query", ""))
+        if not match:
+            raise Exception(f"unsupported query: {params.get('query')}")
+        deck_name = re.sub(r'\\(.)', r'\1', match.group(1))
+        with self._lock:
+            return [note_id for note_id, note in self.notes.items() if note.get("deckName") == deck_name]
+
+    def _action_notesInfo(self, params):
+        infos = []
+        with self._lock:
+            for note_id in params.get("notes", []):
+                note = self.notes.get(note_id)
+                if note is None:
+                    infos.append({})
+                    continue
+                infos.append({
+                    "noteId": note_id,
+                    "modelName": note.get("modelName"),
+                    "tags": note.get("tags", []),
+                    "fields": {
+                        name: {"value": value, "order": order}
+                        for order, (name, value) in enumerate(note.get("fields", {}).items())
+                    },
+                })
+        return infos
+
+    def _action_multi(self, params):
+        replies = []
+        for item in params.get("actions", []):
+            handler = getattr(self, f"_action_{item.get('action')}", None)
+            try:
+                if handler is None:
+                    raise Exception(f"unsupported action: {item.get('action')}")
+                replies.append({"result": handler(item.get("params") or {}), "error": None})
+            except Exception as e:
+                replies.append({"result": None, "error": str(e)})
+        return replies
+
+
+if __name__ == "__main__":
+    with FakeAnkiConnectServer(port=8765) as server:
+        print(f"🧪 疑似AnkiConnectサーバーを起動しました: {server.url}")
+        print("📝 Ctrl+Cで終了します")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
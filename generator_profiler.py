@@ -0,0 +1,196 @@
+"""
+SmartCardGeneratorのステージ別プロファイラー
+ステージごとの処理時間・正規表現の一致数・生成カード数を呼び出しをまたいで集計し、
+処理に時間のかかった入力（回答）を記録する
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# generate_cards_from_llm_response の処理順
+STAGES = ("main", "definitions", "comparisons", "processes", "reverse")
+
+
+class _StageTotals:
+    __slots__ = ("calls", "seconds", "max_seconds", "matches", "cards")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.matches = 0
+        self.cards = 0
+
+
+class CallProfile:
+    """generate_cards_from_llm_response 1回分の計測値"""
+
+    __slots__ = ("question", "answer", "stages", "_stage", "_started", "_matches")
+
+    def __init__(self, question: str, answer: str):
+        self.question = question
+        self.answer = answer
+        # ステージ名 → (秒, 正規表現の一致数, カード数)
+        self.stages: Dict[str, Tuple[float, int, int]] = {}
+        self._stage: Optional[str] = None
+        self._started = 0.0
+        self._matches = 0
+
+    def begin(self, stage: str) -> None:
+        self._stage = stage
+        self._matches = 0
+        self._started = time.perf_counter()
+
+    def count_matches(self, count: int) -> None:
+        """実行中のステージの正規表現の一致数に加算"""
+        self._matches += count
+
+    def end(self, cards: int) -> None:
+        self.stages[self._stage] = (time.perf_counter() - self._started, self._matches, cards)
+        self._stage = None
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for seconds, _, _ in self.stages.values())
+
+
+class StageProfiler:
+    """ステージ別の計測値を集計し、遅かった入力を上位slowest件まで保持する"""
+
+    def __init__(self, slowest: int = 10):
+        self.slowest = slowest
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._totals: Dict[str, _StageTotals] = {stage: _StageTotals() for stage in STAGES}
+        # (合計秒, 連番, CallProfile) の最小ヒープ（最も速いものを先頭に置いて入れ替える）
+        self._slowest: List[Tuple[float, int, CallProfile]] = []
+        self._sequence = itertools.count()
+
+    def record(self, call: CallProfile) -> None:
+        """1回分の計測値を集計に加える"""
+        total = call.seconds
+        with self._lock:
+            self.calls += 1
+            for stage, (seconds, matches, cards) in call.stages.items():
+                totals = self._totals.setdefault(stage, _StageTotals())
+                totals.calls += 1
+                totals.seconds += seconds
+                totals.matches += matches
+                totals.cards += cards
+                if seconds > totals.max_seconds:
+                    totals.max_seconds = seconds
+
+            if self.slowest > 0:
+                entry = (total, next(self._sequence), call)
+                if len(self._slowest) < self.slowest:
+                    heapq.heappush(self._slowest, entry)
+                elif total > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, entry)
+
+    def report(self) -> Dict[str, Any]:
+        """ステージ別の集計値（合計時間に占める割合つき）"""
+        with self._lock:
+            calls = self.calls
+            totals = {stage: (t.calls, t.seconds, t.max_seconds, t.matches, t.cards)
+                      for stage, t in self._totals.items()}
+
+        overall = sum(seconds for _, seconds, _, _, _ in totals.values())
+        return {
+            "calls": calls,
+            "total_seconds": overall,
+            "stages": {
+                stage: {
+                    "calls": stage_calls,
+                    "total_seconds": seconds,
+                    "mean_seconds": seconds / stage_calls if stage_calls else None,
+                    "max_seconds": max_seconds,
+                    "share": seconds / overall if overall else 0.0,
+                    "regex_matches": matches,
+                    "cards": cards,
+                }
+                for stage, (stage_calls, seconds, max_seconds, matches, cards) in totals.items()
+            },
+        }
+
+    def slowest_inputs(self) -> List[Dict[str, Any]]:
+        """合計時間が長かった入力を遅い順に返す"""
+        with self._lock:
+            entries = sorted(self._slowest, key=lambda entry: entry[0], reverse=True)
+        return [
+            {
+                "seconds": total,
+                "question": call.question,
+                "answer": call.answer,
+                "answer_length": len(call.answer),
+                "stages": {stage: seconds for stage, (seconds, _, _) in call.stages.items()},
+            }
+            for total, _, call in entries
+        ]
+
+    def dump_slowest(self, path: str) -> int:
+        """遅かった入力をJSONLで書き出し、件数を返す（再現・調査用）"""
+        entries = self.slowest_inputs()
+        with open(path, "w", encoding="utf-8") as fp:
+            for entry in entries:
+                fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return len(entries)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self._totals = {stage: _StageTotals() for stage in STAGES}
+            self._slowest = []
+
+    def print_report(self) -> None:
+        """ステージ別の集計を表形式で表示"""
+        report = self.report()
+        print(f"\n⏱️  カード生成プロファイル（{report['calls']}回, 合計 {report['total_seconds'] * 1000:.1f}ms）")
+        print(f"   {'ステージ':<12}{'合計(ms)':>10}{'平均(ms)':>10}{'最大(ms)':>10}{'割合':>8}{'一致数':>8}{'カード':>8}")
+        for stage, stats in report["stages"].items():
+            if not stats["calls"]:
+                continue
+            print(f"   {stage:<12}{stats['total_seconds'] * 1000:>10.2f}{stats['mean_seconds'] * 1000:>10.3f}"
+                  f"{stats['max_seconds'] * 1000:>10.3f}{stats['share'] * 100:>7.1f}%"
+                  f"{stats['regex_matches']:>8}{stats['cards']:>8}")
+
+
+def main():
+    """Q&AのJSONL（question / answer / topic）でカード生成をプロファイルする"""
+    import argparse
+    import sys
+    from card_generator import SmartCardGenerator
+    from json_stream import iter_json_records
+
+    parser = argparse.ArgumentParser(description="SmartCardGeneratorのステージ別プロファイル")
+    parser.add_argument("path", help="Q&AのJSONL / JSON配列（'-'で標準入力）")
+    parser.add_argument("--slowest", type=int, default=10, help="記録する遅い入力の件数")
+    parser.add_argument("--dump", help="遅い入力を書き出すJSONLファイル")
+    parser.add_argument("--json", action="store_true", help="集計結果をJSONで出力")
+    args = parser.parse_args()
+
+    generator = SmartCardGenerator(profile=True, slowest=args.slowest)
+    fp = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    try:
+        for item in iter_json_records(fp):
+            if isinstance(item, dict) and item.get("question") and item.get("answer"):
+                generator.generate_cards_from_llm_response(item["question"], item["answer"], item.get("topic", ""))
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+
+    if args.json:
+        print(json.dumps(generator.profiler.report(), ensure_ascii=False, indent=2))
+    else:
+        generator.profiler.print_report()
+
+    if args.dump:
+        count = generator.profiler.dump_slowest(args.dump)
+        print(f"📝 遅い入力 {count}件を {args.dump} に書き出しました", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+ファイルインポートのチェックポイント
+送信済みのチャンクの位置（表形式はバイトオフセット、JSONはカードの件数）を入力ファイルの隣の
+サイドカーファイルに記録し、途中で止まったインポートを続きから再開できるようにする
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+CHECKPOINT_SUFFIX = ".anki-checkpoint.json"
+_VERSION = 1
+
+
+class ImportCheckpoint:
+    """
+    1つの入力ファイルのインポート進捗（<入力ファイル>.anki-checkpoint.json）
+    - offset: 送信済みの最後のカードの行末のバイトオフセット（表形式のみ。JSONはNone）
+    - cards: 送信済みのカード数（JSONは再開時にこの件数だけ解析して読み飛ばす）
+    入力ファイルのサイズか更新日時が変わっていた場合、記録は使わない
+    """
+
+    def __init__(self, source_path: str, deck_name: str, format_type: str, path: Optional[str] = None):
+        self.source_path = os.fspath(source_path)
+        self.path = path or self.source_path + CHECKPOINT_SUFFIX
+        self.deck_name = deck_name
+        self.format_type = format_type
+        self._disabled = False
+
+    def _source_state(self) -> Dict[str, Any]:
+        stat = os.stat(self.source_path)
+        return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns,
+                "deck_name": self.deck_name, "format": self.format_type}
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """再開に使える記録を返す（なければ、または入力ファイルが変わっていればNone）"""
+        try:
+            with open(self.path, encoding="utf-8") as fp:
+                state = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️  チェックポイントを読み込めないため最初からインポートします: {e}")
+            return None
+
+        expected = self._source_state()
+        if state.get("version") != _VERSION or any(state.get(key) != value for key, value in expected.items()):
+            print("⚠️  入力ファイルかインポート設定が前回と異なるため、チェックポイントを使わずに最初からインポートします")
+            return None
+        return state
+
+    def save(self, offset: Optional[int], cards: int, successful: int, failed: int, skipped: int,
+             updated: int = 0) -> None:
+        """送信済みの位置を記録（一時ファイルに書いてから置き換えるため、途中で止まっても壊れない）"""
+        if self._disabled:
+            return
+
+        state = {
+            "version": _VERSION,
+            **self._source_state(),
+            "offset": offset,
+            "cards": cards,
+            "successful": successful,
+            "failed": failed,
+            "skipped": skipped,
+            "updated": updated,
+            "updated_at": time.time(),
+        }
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as fp:
+                json.dump(state, fp, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            # 書き込めない場所にある入力ファイルでも、インポート自体は続ける
+            print(f"⚠️  チェックポイントを書き込めません（再開はできません）: {e}")
+            self._disabled = True
+
+    def clear(self) -> None:
+        """インポートが完了したら記録を削除"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+常駐インポートデーモン
+ローカルHTTPで待ち受け、接続済みのAnkiConnectClientを1つだけ保持して、
+複数のクライアント（短命なスクリプトなど）から届いたインポートジョブを
+短い待ち時間（batch_window）の間まとめ、大きなaddNotesにして送信する
+
+使い方:
+    python3 import_daemon.py                      # 127.0.0.1:8766 で起動
+    ANKI_IMPORT_DAEMON_URL=http://127.0.0.1:8766 python3 my_script.py   # import_to_ankiがデーモン経由になる
+"""
+
+import argparse
+import errno
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DEFAULT_DAEMON_PORT = 8766
+DEFAULT_DAEMON_URL = f"http://127.0.0.1:{DEFAULT_DAEMON_PORT}"
+# 設定されている場合、simple_import.import_to_ankiはこのデーモン経由でインポートする
+DAEMON_URL_ENV = "ANKI_IMPORT_DAEMON_URL"
+
+
+class _ImportJob:
+    """クライアント1回分のインポート要求"""
+
+    __slots__ = ("cards", "skip_duplicates", "result", "done")
+
+    def __init__(self, cards: List[Any], skip_duplicates: bool):
+        self.cards = cards
+        self.skip_duplicates = skip_duplicates
+        self.result: Optional[Dict[str, Any]] = None
+        self.done = threading.Event()
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    """POST /import でジョブを受け付け、GET /stats で集計を返す"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        daemon: "ImportDaemon" = self.server.import_daemon
+        if self.path != "/import":
+            self._reply(404, {"success": False, "error": f"unknown path: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            data = request["data"]
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"success": False, "error": f"不正なリクエスト: {e}"})
+            return
+
+        try:
+            result = daemon.submit(data, request.get("deck_name"), request.get("format_type", "auto"),
+                                   bool(request.get("skip_duplicates")))
+            self._reply(200, result)
+        except Exception as e:
+            self._reply(500, {"success": False, "error": str(e)})
+
+    def do_GET(self):
+        daemon: "ImportDaemon" = self.server.import_daemon
+        if self.path != "/stats":
+            self._reply(404, {"success": False, "error": f"unknown path: {self.path}"})
+            return
+        self._reply(200, daemon.stats())
+
+    def _reply(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        """アクセスログは出力しない"""
+        pass
+
+
+class ImportDaemon:
+    """
+    インポートジョブをまとめてAnkiに送る常駐サーバー
+    - 受け付けたジョブは解析してキューに入れ、送信用スレッドが最初のジョブからbatch_window秒
+      （またはmax_batch_cards枚）まで後続のジョブを待ってから、まとめてimport_cardsする
+    - AnkiConnectClient（コネクションプール・デッキ名のキャッシュ）はデーモンの間使い回す
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_DAEMON_PORT,
+                 anki_url: Optional[str] = None, batch_window: float = 0.05,
+                 max_batch_cards: int = 5000, chunk_size: int = 1000,
+                 default_deck: str = "LLM学習", job_timeout: float = 300.0):
+        from anki_client import AnkiConnectClient
+        from direct_card_importer import DirectCardImporter
+
+        self.batch_window = batch_window
+        self.max_batch_cards = max_batch_cards
+        self.chunk_size = chunk_size
+        self.job_timeout = job_timeout
+
+        self.client = AnkiConnectClient(anki_url)
+        # 解析と送信に使う（重複インデックスを使うジョブ用は最初に必要になったときに作る）
+        self._importer = DirectCardImporter(default_deck, anki_client=self.client)
+        self._dedup_importer = None
+        self._default_deck = default_deck
+
+        self._jobs: "queue.Queue[Optional[_ImportJob]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._counts = {"jobs": 0, "batches": 0, "cards": 0, "added": 0}
+        self._started_at = time.time()
+
+        self._httpd = ThreadingHTTPServer((host, port), _DaemonHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.import_daemon = self
+        self._sender: Optional[threading.Thread] = None
+        self._server_thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ImportDaemon":
+        """送信用スレッドとHTTPサーバーをバックグラウンドで開始"""
+        self._start_sender()
+        self._server_thread = threading.Thread(target=self._httpd.serve_forever, name="import-daemon-http",
+                                               daemon=True)
+        self._server_thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """フォアグラウンドで待ち受ける（Ctrl+Cで停止）"""
+        self._start_sender()
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """新しいジョブの受け付けを止め、キューに残ったジョブを送信してから終了"""
+        if self._server_thread is not None:
+            self._httpd.shutdown()
+            self._server_thread = None
+        self._httpd.server_close()
+        if self._sender is not None:
+            self._jobs.put(None)
+            self._sender.join()
+            self._sender = None
+        self.client.close()
+
+    def __enter__(self) -> "ImportDaemon":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _start_sender(self) -> None:
+        if self._sender is None:
+            self._sender = threading.Thread(target=self._run, name="import-daemon-sender", daemon=True)
+            self._sender.start()
+
+    def submit(self, data: str, deck_name: Optional[str] = None, format_type: str = "auto",
+               skip_duplicates: bool = False) -> Dict[str, Any]:
+        """テキストを解析してジョブを登録し、まとめて送信された結果を待って返す"""
+        cards = self._importer.parse_text(data, deck_name or self._default_deck, format_type)
+        if not cards:
+            return {"success": False, "message": "有効なカードデータが見つかりませんでした"}
+
+        job = _ImportJob(cards, skip_duplicates)
+        self._jobs.put(job)
+        if not job.done.wait(self.job_timeout):
+            raise Exception("インポートがタイムアウトしました")
+        return job.result
+
+    def _run(self) -> None:
+        """最初のジョブからbatch_window秒の間に届いたジョブをまとめて送信する"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+
+            jobs = [job]
+            cards = len(job.cards)
+            deadline = time.monotonic() + self.batch_window
+            stopping = False
+            while cards < self.max_batch_cards:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._jobs.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                jobs.append(job)
+                cards += len(job.cards)
+
+            self._process(jobs)
+            if stopping:
+                return
+
+    def _process(self, jobs: List[_ImportJob]) -> None:
+        """ジョブをまとめてインポートし、結果をジョブごとに振り分ける"""
+        for skip_duplicates in (False, True):
+            group = [job for job in jobs if job.skip_duplicates == skip_duplicates]
+            if not group:
+                continue
+            try:
+                importer = self._get_dedup_importer() if skip_duplicates else self._importer
+                cards = [card for job in group for card in job.cards]
+                self._resolve(group, importer.import_cards(cards, chunk_size=self.chunk_size))
+            except Exception as e:
+                for job in group:
+                    job.result = {"success": False, "error": str(e)}
+                    job.done.set()
+
+    def _get_dedup_importer(self):
+        if self._dedup_importer is None:
+            from direct_card_importer import DirectCardImporter
+            from duplicate_index import DuplicateIndex
+            self._dedup_importer = DirectCardImporter(self._default_deck, duplicate_index=DuplicateIndex(),
+                                                      anki_client=self.client)
+        return self._dedup_importer
+
+    def _resolve(self, jobs: List[_ImportJob], result: Dict[str, Any]) -> None:
+        """まとめた結果（カードの一覧）から、ジョブごとの件数を求めて待っているクライアントに返す"""
+        if not result.get("success"):
+            for job in jobs:
+                job.result = dict(result)
+                job.done.set()
+            return
+
+        outcome: Dict[int, str] = {}
+        for key in ("successful", "failed", "skipped", "updated"):
+            for card in result.get(f"{key}_cards", []):
+                outcome[id(card)] = key
+
+        with self._stats_lock:
+            self._counts["batches"] += 1
+            self._counts["jobs"] += len(jobs)
+            self._counts["cards"] += sum(len(job.cards) for job in jobs)
+            self._counts["added"] += result.get("successful", 0)
+
+        for job in jobs:
+            counts = {"successful": 0, "failed": 0, "skipped": 0, "updated": 0}
+            for card in job.cards:
+                counts[outcome.get(id(card), "failed")] += 1
+            job.result = {
+                "success": True,
+                "total_cards": len(job.cards),
+                **counts,
+                "batched_jobs": len(jobs),
+            }
+            job.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """受け付けたジョブ数・送信したバッチ数などの集計"""
+        with self._stats_lock:
+            counts = dict(self._counts)
+        counts["pending_jobs"] = self._jobs.qsize()
+        counts["uptime_seconds"] = round(time.time() - self._started_at, 1)
+        return counts
+
+
+def is_daemon_unreachable(error: BaseException) -> bool:
+    """
+    デーモンに接続できなかった（ジョブが届いていないことが確実な）エラーか
+    タイムアウトや接続後の切断は、デーモンが処理中の可能性があるのでFalse
+    """
+    if isinstance(error, ConnectionRefusedError):
+        return True
+    return isinstance(error, OSError) and error.errno in (errno.EHOSTUNREACH, errno.ENETUNREACH)
+
+
+def submit_import(data: str, deck_name: str = "LLM学習", format_type: str = "auto",
+                  skip_duplicates: bool = False, daemon_url: Optional[str] = None,
+                  timeout: float = 300.0) -> Dict[str, Any]:
+    """
+    デーモンにインポートジョブを送り、結果を返す（シンクライアント）
+    デーモンが起動していない場合はConnectionRefusedErrorを送出する（is_daemon_unreachableで判定できる）
+    応答待ちのタイムアウトはTimeoutError（ジョブはデーモンで処理中の可能性がある）
+    """
+    # DirectCardImporter._is_file_path と同じ判定。ファイルはここで読んで本文を送る
+    if isinstance(data, os.PathLike) or ('\n' not in data and len(data) < 4096 and os.path.isfile(data)):
+        with open(data, encoding="utf-8") as fp:
+            data = fp.read()
+
+    url = urllib.parse.urlsplit(daemon_url or os.environ.get(DAEMON_URL_ENV) or DEFAULT_DAEMON_URL)
+    body = json.dumps({"data": data, "deck_name": deck_name, "format_type": format_type,
+                       "skip_duplicates": skip_duplicates}).encode("utf-8")
+    conn = http.client.HTTPConnection(url.hostname or "127.0.0.1", url.port or DEFAULT_DAEMON_PORT,
+                                      timeout=timeout)
+    try:
+        conn.request("POST", "/import", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return json.loads(response.read().decode("utf-8"))
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="複数のクライアントのインポートをまとめて送信する常駐デーモン")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=DEFAULT_DAEMON_PORT, help="待ち受けるポート")
+    parser.add_argument("--anki-url", help="AnkiConnectのURL（省略時はANKI_CONNECT_URLまたは既定値）")
+    parser.add_argument("--window", type=float, default=0.05, help="ジョブをまとめる待ち時間（秒）")
+    parser.add_argument("--max-batch", type=int, default=5000, help="1回にまとめる最大カード数")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="addNotes 1回あたりのカード数")
+    parser.add_argument("--deck", default="LLM学習", help="デッキ名が指定されなかったジョブのデッキ")
+    args = parser.parse_args()
+
+    daemon = ImportDaemon(args.host, args.port, args.anki_url, args.window, args.max_batch,
+                          args.chunk_size, args.deck)
+    print(f"🛰️  インポートデーモンを {daemon.url} で起動しました（Ctrl+Cで終了）")
+    print(f"💡 export {DAEMON_URL_ENV}={daemon.url} でimport_to_ankiがデーモン経由になります")
+    daemon.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
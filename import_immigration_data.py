@@ -23,8 +23,8 @@ def main():
     print("🚀 移民法英語データをAnkiにインポート開始")
     print("="*50)
     
-    # データをインポート
-    result = import_to_anki(immigration_data, deck_name="移民英語")
+    # データをインポート（再実行時は既に登録済みのカードを送信しない）
+    result = import_to_anki(immigration_data, deck_name="移民英語", skip_duplicates=True)
     
     if result.get('success'):
         print(f"\n✅ インポート完了!")
@@ -39,6 +39,9 @@ def main():
         
         if result['failed'] > 0:
             print(f"\n⚠️  {result['failed']} 枚のカードの追加に失敗しました")
+        
+        if result.get('skipped', 0) > 0:
+            print(f"\n⏭️  {result['skipped']} 枚は登録済みのためスキップしました")
             
     else:
         print(f"❌ インポートに失敗しました: {result.get('error', '不明なエラー')}")
@@ -0,0 +1,211 @@
+"""
+大きなJSONデータを逐次的に読み込むためのユーティリティ
+JSONL（1行1オブジェクト）とトップレベルのJSON配列の両方に対応
+"""
+
+import json
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+_WHITESPACE = " \t\r\n"
+# 数値の続きになりうる文字
+_NUMBER_CHARS = "0123456789.eE+-"
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """ファイルからチャンク単位で読み込み、消費済み部分を捨てるテキストバッファ"""
+
+    def __init__(self, fp: TextIO, chunk_size: int):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """追加で読み込む（読み込めなければFalse）"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 消費済みの部分を捨ててメモリ使用量を一定に保つ
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self, skip: str = _WHITESPACE) -> str:
+        """skipに含まれる文字を読み飛ばし、次の文字を返す（終端なら空文字）"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in skip:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def decode_value(self) -> Any:
+        """現在位置から1つのJSON値を読み込む"""
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as e:
+                # バッファの途中で見つかった構文エラーは、読み足しても直らないのですぐに送出する
+                # （不正なレコード1件のためにファイルの残りを読み込まない）
+                if not _may_be_truncated(e, len(self.text)) or not self.fill():
+                    raise
+                continue
+            # 数値などはバッファ末尾で途切れている可能性があるので読み足して再試行
+            # （"1." や "1e" で途切れた数値は、その手前までの短い数値として読めてしまう）
+            if (end == len(self.text) or _is_number(value) and self.text[end] in _NUMBER_CHARS) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _may_be_truncated(error: json.JSONDecodeError, buffered: int) -> bool:
+    """構文エラーが、値がバッファの末尾で途切れていることによるものかもしれないか"""
+    # 閉じていない文字列は開始位置で報告される（改行などの制御文字があれば別のエラーになる）
+    if error.msg.startswith("Unterminated string"):
+        return True
+    # それ以外は末尾付近で報告される（途中で切れた \uXXXX や -Infinity を含む）
+    return error.pos >= buffered - 9
+
+
+def _expect_separator(buffer: _Buffer, close: str, what: str) -> bool:
+    """
+    要素の後の区切りを読む。',' なら次の要素があるのでTrue、closeなら閉じてFalse
+    それ以外（区切りなし・末尾の ','・連続した ','）は構文エラー
+    """
+    char = buffer.peek()
+    if char == close:
+        buffer.pos += 1
+        return False
+    if char != ",":
+        if not char:
+            raise json.JSONDecodeError(f"{what}が閉じられていません", buffer.text, buffer.pos)
+        raise json.JSONDecodeError(f"',' または '{close}' がありません", buffer.text, buffer.pos)
+    buffer.pos += 1
+    if buffer.peek() in (",", close):
+        raise json.JSONDecodeError(f"{what}に空の要素があります", buffer.text, buffer.pos)
+    return True
+
+
+def iter_json_records(fp: TextIO, chunk_size: int = 64 * 1024) -> Iterator[Any]:
+    """
+    ファイルからJSONレコードを1件ずつ返すジェネレータ
+    - トップレベルが配列の場合: 配列の要素を順に返す
+    - それ以外: 空白・改行区切りで並んだ値（JSONL）を順に返す
+      {"cards": [...]} 形式のオブジェクトはcardsの要素を返す
+    """
+    buffer = _Buffer(fp, chunk_size)
+
+    if buffer.peek() == "[":
+        yield from _iter_array_items(buffer)
+        return
+
+    while buffer.peek():
+        value = buffer.decode_value()
+        if isinstance(value, dict) and isinstance(value.get("cards"), list):
+            yield from value["cards"]
+        else:
+            yield value
+
+
+def iter_json_array_member(fp: TextIO, key: str, members: Optional[Dict[str, Any]] = None,
+                           chunk_size: int = 64 * 1024) -> Iterator[Any]:
+    """
+    トップレベルのJSONオブジェクトを読み、keyの配列の要素を1件ずつ返すジェネレータ
+    （AnkiConnectのレスポンス {"result": [...], "error": null} のresultなど）
+    key以外のメンバーと、配列でなかった場合のkeyの値はmembersに格納する
+    """
+    buffer = _Buffer(fp, chunk_size)
+
+    if buffer.peek() != "{":
+        raise json.JSONDecodeError("オブジェクトではありません", buffer.text, buffer.pos)
+    buffer.pos += 1
+    char = buffer.peek()
+    if char == "}":
+        buffer.pos += 1
+        return
+    if not char:
+        raise json.JSONDecodeError("オブジェクトが閉じられていません", buffer.text, buffer.pos)
+
+    while True:
+        if buffer.peek() != '"':
+            raise json.JSONDecodeError("メンバー名がありません", buffer.text, buffer.pos)
+        name = buffer.decode_value()
+        if buffer.peek() != ":":
+            raise json.JSONDecodeError("':' がありません", buffer.text, buffer.pos)
+        buffer.pos += 1
+
+        if buffer.peek() == "[" and name == key:
+            yield from _iter_array_items(buffer)
+        else:
+            value = buffer.decode_value()
+            if members is not None:
+                members[name] = value
+
+        if not _expect_separator(buffer, "}", "オブジェクト"):
+            return
+
+
+def _iter_array_items(buffer: _Buffer) -> Iterator[Any]:
+    """現在位置の配列（先頭の '[' から）の要素を順に返し、']' の直後まで読み進める"""
+    buffer.pos += 1
+    char = buffer.peek()
+    if char == "]":
+        buffer.pos += 1
+        return
+    if not char:
+        raise json.JSONDecodeError("配列が閉じられていません", buffer.text, buffer.pos)
+
+    while True:
+        yield buffer.decode_value()
+        if not _expect_separator(buffer, "]", "配列"):
+            return
+
+
+def _check_chunk_sizes() -> None:
+    """チャンクサイズを変えても結果がjson.loadsと一致するか確認する"""
+    import io
+
+    cases = [
+        '[1.5, 2]', '[-0.25e-3, 1E+10, 3]', '[1e5,2.0e-1,-3.25]', '[0, -1, 12345678901234567890]',
+        '[NaN, -Infinity, Infinity, 1.5]', '[true, false, null, "\\u3042\\n"]',
+        '{"cards": [{"front": "質問", "back": "答え", "score": 0.875}]}',
+        '[{"a": [1.25, {"b": -2.5e2}]}, "x", 7.0]',
+    ]
+    for text in cases:
+        expected = json.loads(text)
+        if isinstance(expected, dict):
+            expected = expected["cards"]
+        for chunk_size in range(1, len(text) + 2):
+            actual = list(iter_json_records(io.StringIO(text), chunk_size))
+            if json.dumps(actual) != json.dumps(expected):
+                raise Exception(f"chunk_size={chunk_size} で結果が異なります: {text!r} -> {actual!r}")
+
+        jsonl = "\n".join(json.dumps(item) for item in expected)
+        for chunk_size in range(1, len(jsonl) + 2):
+            actual = list(iter_json_records(io.StringIO(jsonl), chunk_size))
+            if json.dumps(actual) != json.dumps(expected):
+                raise Exception(f"chunk_size={chunk_size} で結果が異なります: {jsonl!r} -> {actual!r}")
+
+    for text in ('[1., 2]', '[1e, 2]', '[1 2]', '[1,,2]', '[1,]', '[-]'):
+        for chunk_size in range(1, len(text) + 2):
+            try:
+                list(iter_json_records(io.StringIO(text), chunk_size))
+            except json.JSONDecodeError:
+                continue
+            raise Exception(f"chunk_size={chunk_size} で不正なJSONを受け付けました: {text!r}")
+
+    print("✅ すべてのチャンクサイズで結果が一致しました")
+
+
+if __name__ == "__main__":
+    _check_chunk_sizes()
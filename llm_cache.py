@@ -0,0 +1,117 @@
+"""
+LLM回答のローカルキャッシュ
+同じ質問を再実行したときにLLMのレイテンシとコストを払わずに済むようにする
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(".anki_cache", "llm_responses.sqlite3")
+
+
+class LLMResponseCache:
+    """プロンプトのハッシュをキーにしたSQLiteのLLM回答キャッシュ（LRU + TTL）"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 10000,
+                 ttl_seconds: Optional[float] = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 並行実行中のLLM呼び出しから使われるため、1つの接続をロックで保護する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+
+    @staticmethod
+    def make_key(provider: str, prompt: str) -> str:
+        """プロバイダーとプロンプト（テンプレート + 質問・コンテキスト）からキーを作成"""
+        payload = json.dumps([provider, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュされた回答を返す（なければNone）"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and self.ttl_seconds is not None and row[1] + self.ttl_seconds < now:
+                # 期限切れのエントリは削除してミス扱い
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """回答を保存し、期限切れと上限を超えた古いエントリを削除"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+
+            if self.ttl_seconds is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+                )
+
+            # 最後に使われたのが古い順に、max_entriesを超えた分を削除
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット・ミスの回数と現在のエントリ数"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+    def clear(self) -> None:
+        """すべてのエントリを削除"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
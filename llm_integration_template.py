@@ -5,15 +5,50 @@ LLM API統合テンプレート
 
 import os
 import json
-from typing import Dict, List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 from llm_interface import LearningSession
+from llm_cache import LLMResponseCache
+
+
+class TokenBucket:
+    """LLM API呼び出しのレート制限（トークンバケット方式、スレッドセーフ）"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate は正の値を指定してください")
+        self.rate = rate                              # 1秒あたりに補充されるトークン数
+        self.capacity = capacity or max(1.0, rate)    # 一度に使えるトークンの上限（バースト）
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """トークンを1つ取得（足りなければ補充されるまで待機）"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
 
 class LLMIntegratedSession(LearningSession):
     """実際のLLM APIと統合した学習セッション"""
     
-    def __init__(self, deck_name: str = "LLM学習", llm_provider: str = "openai"):
+    def __init__(self, deck_name: str = "LLM学習", llm_provider: str = "openai",
+                 use_cache: bool = True, cache: Optional[LLMResponseCache] = None):
         super().__init__(deck_name)
         self.llm_provider = llm_provider
+        # 同じプロンプトへの回答はローカルキャッシュから返す
+        self.response_cache = cache or (LLMResponseCache() if use_cache else None)
         self.setup_llm()
     
     def setup_llm(self):
@@ -60,8 +95,29 @@ class LLMIntegratedSession(LearningSession):
             # フォールバック: シミュレーション回答
             return self._generate_simulated_answer(question, "")
     
+    def _cached_response(self, provider: str, prompt: str) -> Optional[str]:
+        """キャッシュ済みの回答を返す（キャッシュ無効時・未登録時はNone）"""
+        if self.response_cache is None:
+            return None
+        return self.response_cache.get(LLMResponseCache.make_key(provider, prompt))
+    
+    def _store_response(self, provider: str, prompt: str, answer: str) -> None:
+        """API呼び出しに成功した回答をキャッシュに保存"""
+        if self.response_cache is not None:
+            self.response_cache.put(LLMResponseCache.make_key(provider, prompt), answer)
+    
+    def cache_stats(self) -> Dict:
+        """LLM回答キャッシュのヒット・ミス数"""
+        if self.response_cache is None:
+            return {"hits": 0, "misses": 0, "hit_rate": 0.0, "entries": 0}
+        return self.response_cache.stats()
+    
     def _call_openai_api(self, prompt: str) -> str:
         """OpenAI API呼び出し（実装例）"""
+        cached = self._cached_response("openai", prompt)
+        if cached is not None:
+            return cached
+        
         try:
             # import openai  # pip install openai
             # 
@@ -74,9 +130,11 @@ class LLMIntegratedSession(LearningSession):
             #     max_tokens=1000,
             #     temperature=0.7
             # )
-            # return response.choices[0].message.content
+            # answer = response.choices[0].message.content
+            # self._store_response("openai", prompt, answer)  # 実際のAPIの回答だけをキャッシュする
+            # return answer
             
-            # 実装プレースホルダー
+            # 実装プレースホルダー（API呼び出しではないのでキャッシュしない）
             return "OpenAI APIとの統合が必要です。コメントアウトされたコードを参照してください。"
             
         except Exception as e:
@@ -85,6 +143,10 @@ class LLMIntegratedSession(LearningSession):
     
     def _call_claude_api(self, prompt: str) -> str:
         """Claude API呼び出し（実装例）"""
+        cached = self._cached_response("claude", prompt)
+        if cached is not None:
+            return cached
+        
         try:
             # import anthropic  # pip install anthropic
             # 
@@ -96,9 +158,11 @@ class LLMIntegratedSession(LearningSession):
             #         {"role": "user", "content": prompt}
             #     ]
             # )
-            # return response.content[0].text
+            # answer = response.content[0].text
+            # self._store_response("claude", prompt, answer)  # 実際のAPIの回答だけをキャッシュする
+            # return answer
             
-            # 実装プレースホルダー
+            # 実装プレースホルダー（API呼び出しではないのでキャッシュしない）
             return "Claude APIとの統合が必要です。コメントアウトされたコードを参照してください。"
             
         except Exception as e:
@@ -194,8 +258,14 @@ def create_study_plan(subjects: List[str], session_name: str = "学習計画") -
     
     return study_plan
 
-def execute_study_plan(study_plan: Dict, deck_name: str = None):
-    """学習計画の実行"""
+def execute_study_plan(study_plan: Dict, deck_name: str = None, concurrency: int = 1,
+                       requests_per_second: Optional[float] = None):
+    """
+    学習計画の実行
+    concurrencyに2以上を指定すると、LLM呼び出しを最大concurrency件まで並行して行い、
+    回答が届いたものから順にカード生成・Ankiへの追加を行う
+    requests_per_secondを指定するとLLM呼び出しの頻度をトークンバケットで制限する
+    """
     
     if not deck_name:
         deck_name = study_plan["session_name"]
@@ -205,26 +275,74 @@ def execute_study_plan(study_plan: Dict, deck_name: str = None):
     print(f"\n🎯 学習計画'{study_plan['session_name']}'を実行します")
     print(f"📊 総質問数: {study_plan['total_questions']}件")
     
-    total_cards = 0
+    rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
     
-    for subject, questions in study_plan["subjects"].items():
-        print(f"\n📖 {subject} ({len(questions)}件の質問)")
+    if concurrency > 1:
+        total_cards = _execute_concurrently(session, study_plan, concurrency, rate_limiter)
+    else:
+        total_cards = 0
         
-        for i, question in enumerate(questions, 1):
-            print(f"\n[{i}/{len(questions)}] {question}")
+        for subject, questions in study_plan["subjects"].items():
+            print(f"\n📖 {subject} ({len(questions)}件の質問)")
             
-            # 実際のLLMを呼び出し
-            answer = session.call_llm_api(question)
-            print(f"回答: {answer[:100]}...")
-            
-            # 自動でカード生成
-            result = session.process_qa_pair(question, answer, subject)
-            total_cards += result['cards_added']
+            for i, question in enumerate(questions, 1):
+                print(f"\n[{i}/{len(questions)}] {question}")
+                
+                # 実際のLLMを呼び出し
+                if rate_limiter:
+                    rate_limiter.acquire()
+                answer = session.call_llm_api(question)
+                print(f"回答: {answer[:100]}...")
+                
+                # 自動でカード生成
+                result = session.process_qa_pair(question, answer, subject)
+                total_cards += result['cards_added']
     
     print(f"\n🎉 学習計画完了!")
     print(f"📊 総生成カード数: {total_cards}枚")
+    
+    stats = session.cache_stats()
+    if stats["hits"] or stats["misses"]:
+        print(f"💾 LLM回答キャッシュ: ヒット {stats['hits']}件 / ミス {stats['misses']}件")
     session.show_session_summary()
 
+def _execute_concurrently(session: LLMIntegratedSession, study_plan: Dict, concurrency: int,
+                          rate_limiter: Optional[TokenBucket]) -> int:
+    """LLM呼び出しを並行実行し、回答が届いた順にカード化する"""
+    tasks: List[Tuple[str, str]] = [
+        (subject, question)
+        for subject, questions in study_plan["subjects"].items()
+        for question in questions
+    ]
+    
+    def ask(question: str) -> str:
+        if rate_limiter:
+            rate_limiter.acquire()
+        return session.call_llm_api(question)
+    
+    print(f"⚡ 最大{concurrency}件のLLM呼び出しを並行して実行します")
+    
+    total_cards = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(ask, question): (subject, question) for subject, question in tasks}
+        
+        # カード生成とAnkiへの追加はメインスレッドで、回答が届いた順に行う
+        for done, future in enumerate(as_completed(futures), 1):
+            subject, question = futures[future]
+            print(f"\n[{done}/{len(tasks)}] {question}")
+            
+            try:
+                answer = future.result()
+            except Exception as e:
+                print(f"❌ LLM呼び出しエラー: {e}")
+                continue
+            
+            print(f"回答: {answer[:100]}...")
+            result = session.process_qa_pair(question, answer, subject)
+            total_cards += result['cards_added']
+    
+    return total_cards
+
 # 使用例
 if __name__ == "__main__":
     print("🚀 LLM統合学習システム")
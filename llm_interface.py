@@ -1,27 +1,71 @@
+from __future__ import annotations
+
 import json
+import os
 import sys
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from anki_client import AnkiConnectClient
 from card_generator import SmartCardGenerator
 from anki_schema import AnkiCard
 
+if TYPE_CHECKING:
+    from note_outbox import NoteOutbox
+
+# ワーカープロセスごとに1つだけ生成するカード生成器
+_worker_generator: Optional[SmartCardGenerator] = None
+
+def _generate_cards_in_worker(qa: Tuple[str, str, str]) -> List[AnkiCard]:
+    """ワーカープロセスでQ&Aペア1件分のカードを生成"""
+    global _worker_generator
+    if _worker_generator is None:
+        _worker_generator = SmartCardGenerator()
+    question, answer, topic = qa
+    return _worker_generator.generate_cards_from_llm_response(question, answer, topic)
+
 class LearningSession:
     """LLMとの学習セッションを管理するクラス"""
     
-    def __init__(self, deck_name: str = "LLM学習"):
+    def __init__(self, deck_name: str = "LLM学習", outbox: Optional[NoteOutbox] = None):
         self.anki_client = AnkiConnectClient()
         self.card_generator = SmartCardGenerator()
         self.deck_name = deck_name
         self.session_history = []
+        # 指定されている場合、Ankiに接続できなくても生成したカードをアウトボックスに保存する
+        self.outbox = outbox
+        self.offline = False
+        # 接続確認とデッキ作成は最初にカードを追加するとき（connect）まで行わない
+        self._connected = False
+    
+    def connect(self) -> bool:
+        """
+        AnkiConnectへの接続を確認し、デッキを用意する（2回目以降は何もしない）
+        接続できればTrue、アウトボックスに保存するオフラインモードになればFalseを返す
+        """
+        if self._connected:
+            return not self.offline
+        
+        try:
+            deck_names = self.anki_client.get_deck_names()
+        except Exception:
+            if self.outbox is None:
+                raise Exception("AnkiConnectに接続できません。Ankiが起動していることを確認してください。")
+            self.offline = True
+            self._connected = True
+            self.outbox.start()
+            print("📮 オフラインモード: 生成したカードはAnkiに接続でき次第送信します。")
+            return False
         
-        # AnkiConnect接続を確認
-        if not self.anki_client.test_connection():
-            raise Exception("AnkiConnectに接続できません。Ankiが起動していることを確認してください。")
+        self._connected = True
         
         # デッキを作成（存在しない場合）
-        if deck_name not in self.anki_client.get_deck_names():
-            self.anki_client.create_deck(deck_name)
-            print(f"新しいデッキ '{deck_name}' を作成しました。")
+        if self.deck_name not in deck_names:
+            self.anki_client.create_deck(self.deck_name)
+            print(f"新しいデッキ '{self.deck_name}' を作成しました。")
+        
+        # 前回オフライン時に溜まったカードを先に送信
+        if self.outbox is not None and len(self.outbox) > 0:
+            self.outbox.flush()
+        return True
     
     def process_qa_pair(self, question: str, answer: str, topic: str = "") -> Dict:
         """質問と回答のペアを処理してAnkiカードを生成・追加"""
@@ -36,6 +80,9 @@ class LearningSession:
         
         print(f"\n🎴 {len(cards)}枚のカードを生成しました")
         
+        if not self.connect():
+            return self._queue_cards(question, answer, topic, cards)
+        
         # カードをAnkiに追加
         successful_cards = []
         failed_cards = []
@@ -74,8 +121,38 @@ class LearningSession:
             "failed_cards": [card.front for card in failed_cards]
         }
     
+    def _queue_cards(self, question: str, answer: str, topic: str, cards: List[AnkiCard]) -> Dict:
+        """オフライン時: 生成したカードをアウトボックスに保存"""
+        for card in cards:
+            card.deck_name = self.deck_name
+        queued = self.outbox.enqueue(cards)
+        print(f"📮 {queued}枚のカードをアウトボックスに保存しました")
+        
+        self.session_history.append({
+            "question": question,
+            "answer": answer,
+            "topic": topic,
+            "cards_generated": len(cards),
+            "cards_added": 0,
+            "cards_failed": 0,
+            "cards_queued": queued
+        })
+        
+        return {
+            "success": True,
+            "cards_generated": len(cards),
+            "cards_added": 0,
+            "cards_failed": 0,
+            "cards_queued": queued,
+            "successful_cards": [],
+            "failed_cards": []
+        }
+    
     def interactive_mode(self):
         """インタラクティブモードでの学習セッション"""
+        # 質問を入力してもらう前に接続できるか確認する
+        self.connect()
+        
         print("🎓 LLM学習セッションを開始します")
         print("📝 'quit'または'exit'で終了します")
         print("💭 トピックを指定する場合は '[トピック] 質問内容' の形式で入力してください")
@@ -181,8 +258,16 @@ Pythonは機械学習、Web開発、データ分析、自動化スクリプト
 
 より詳細な情報については、専門的な資料を参照することをお勧めします。"""
     
-    def batch_mode(self, qa_pairs: List[Dict[str, str]]):
-        """バッチモードで複数のQ&Aペアを処理"""
+    def batch_mode(self, qa_pairs: List[Dict[str, str]], workers: Optional[int] = 1,
+                   upload_batch_size: int = 500):
+        """
+        バッチモードで複数のQ&Aペアを処理
+        workersに2以上（またはNoneでCPUコア数）を指定すると、カード生成を
+        複数プロセスに分散し、生成されたカードをまとめてAnkiに追加する
+        """
+        if workers is None or workers > 1:
+            return self._parallel_batch_mode(qa_pairs, workers, upload_batch_size)
+        
         print(f"📦 バッチモード: {len(qa_pairs)}件のQ&Aペアを処理します")
         
         total_generated = 0
@@ -204,6 +289,107 @@ Pythonは機械学習、Web開発、データ分析、自動化スクリプト
         print(f"   総生成カード数: {total_generated}枚")
         print(f"   総追加カード数: {total_added}枚")
     
+    def _parallel_batch_mode(self, qa_pairs: List[Dict[str, str]], workers: Optional[int],
+                             upload_batch_size: int):
+        """カード生成をProcessPoolExecutorで並列化したバッチモード"""
+        from concurrent.futures import ProcessPoolExecutor
+        
+        tasks = [
+            (qa_pair.get('question', ''), qa_pair.get('answer', ''), qa_pair.get('topic', ''))
+            for qa_pair in qa_pairs
+        ]
+        tasks = [task for task in tasks if task[0] and task[1]]
+        workers = workers or os.cpu_count() or 1
+        
+        print(f"📦 並列バッチモード: {len(tasks)}件のQ&Aペアを{workers}プロセスで処理します")
+        
+        total_generated = 0
+        total_added = 0
+        # (カード, そのカードを生成したQ&Aペアの履歴レコード)
+        pending: List[Tuple[AnkiCard, Dict]] = []
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            # mapは入力順に結果を返すので、履歴も入力順に記録される
+            for (question, answer, topic), cards in zip(tasks, executor.map(
+                    _generate_cards_in_worker, tasks, chunksize=chunksize)):
+                record = {
+                    "question": question,
+                    "answer": answer,
+                    "topic": topic,
+                    "cards_generated": len(cards),
+                    "cards_added": 0,
+                    "cards_failed": 0
+                }
+                self.session_history.append(record)
+                total_generated += len(cards)
+                
+                for card in cards:
+                    card.deck_name = self.deck_name
+                    pending.append((card, record))
+                
+                if len(pending) >= upload_batch_size:
+                    total_added += self._upload_pending(pending)
+                    pending = []
+        
+        if pending:
+            total_added += self._upload_pending(pending)
+        
+        print(f"\n📊 バッチ処理完了:")
+        print(f"   総生成カード数: {total_generated}枚")
+        print(f"   総追加カード数: {total_added}枚")
+    
+    def _upload_pending(self, pending: List[Tuple[AnkiCard, Dict]]) -> int:
+        """生成済みカードをaddNotes 1回で追加し、結果を各Q&Aペアの履歴に反映"""
+        if not self.connect():
+            return self._queue_pending(pending)
+        
+        cards = [card for card, _ in pending]
+        try:
+            note_ids = self.anki_client.add_notes(cards)
+        except Exception as e:
+            if self.outbox is not None and not self.anki_client.test_connection():
+                # 途中でAnkiとの接続が切れた: 捨てずにアウトボックスに保存し、接続でき次第送信する
+                print(f"⚠️  Ankiに接続できなくなったため、カードをアウトボックスに保存します: {e}")
+                self.outbox.start()
+                return self._queue_pending(pending)
+            # バッチ全体がエラーになった場合は1枚ずつ送り直して失敗したカードを特定
+            print(f"⚠️  addNotesに失敗したため1枚ずつ再送します: {e}")
+            note_ids = self._add_one_by_one(cards)
+        
+        added = 0
+        for i, (card, record) in enumerate(pending):
+            if i < len(note_ids) and note_ids[i]:
+                record["cards_added"] += 1
+                added += 1
+            else:
+                record["cards_failed"] += 1
+        
+        print(f"✅ {added}/{len(pending)}枚のカードを追加しました")
+        return added
+    
+    def _add_one_by_one(self, cards: List[AnkiCard]) -> List[Optional[int]]:
+        """カードを1枚ずつaddNoteで追加し、カードと同じ順のノートID（失敗はNone）を返す"""
+        note_ids: List[Optional[int]] = []
+        for card in cards:
+            try:
+                note_id = self.anki_client.add_note(card)
+                if not note_id:
+                    print(f"❌ カード追加失敗: {card.front[:50]}...")
+                note_ids.append(note_id)
+            except Exception as e:
+                note_ids.append(None)
+                print(f"❌ エラー: {card.front[:50]}... - {str(e)}")
+        return note_ids
+    
+    def _queue_pending(self, pending: List[Tuple[AnkiCard, Dict]]) -> int:
+        """生成済みカードをアウトボックスに保存し、各Q&Aペアの履歴に反映（追加した枚数として0を返す）"""
+        self.outbox.enqueue([card for card, _ in pending])
+        for _, record in pending:
+            record["cards_queued"] = record.get("cards_queued", 0) + 1
+        print(f"📮 {len(pending)}枚のカードをアウトボックスに保存しました")
+        return 0
+    
     def show_session_summary(self):
         """セッションの要約を表示"""
         if not self.session_history:
@@ -213,11 +399,14 @@ Pythonは機械学習、Web開発、データ分析、自動化スクリプト
         total_questions = len(self.session_history)
         total_generated = sum(record['cards_generated'] for record in self.session_history)
         total_added = sum(record['cards_added'] for record in self.session_history)
+        total_queued = sum(record.get('cards_queued', 0) for record in self.session_history)
         
         print(f"\n📊 セッション要約:")
         print(f"   質問数: {total_questions}件")
         print(f"   生成されたカード: {total_generated}枚")
         print(f"   Ankiに追加されたカード: {total_added}枚")
+        if total_queued:
+            print(f"   アウトボックスで送信待ちのカード: {total_queued}枚")
         print(f"   成功率: {(total_added/total_generated*100) if total_generated > 0 else 0:.1f}%")
 
 def main():
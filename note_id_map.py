@@ -0,0 +1,167 @@
+"""
+ソースキー → AnkiノートIDの永続マッピング
+追加したノートのIDを (デッキ, ノートタイプ, 正規化した表面) のハッシュをキーにディスクへ保存し、
+同じデータの再インポートを何も送らずに済ませるか、内容が変わったカードだけupdateNoteFieldsで更新する
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from anki_schema import BACK_FIELD, FRONT_FIELD
+from duplicate_index import fingerprint
+
+DEFAULT_MAP_PATH = os.path.join(".anki_cache", "note_ids.sqlite3")
+
+# SQLiteの1文あたりのプレースホルダー数の上限（古いバージョンは999）
+_SQL_BATCH = 500
+
+
+def source_key(card: Any) -> bytes:
+    """カードの安定したキー（重複インデックスと同じ (デッキ, ノートタイプ, 正規化した表面) のハッシュ）"""
+    return fingerprint(card.deck_name, card.model_name, card.front)
+
+
+def content_hash(card: Any) -> bytes:
+    """更新が必要かどうかの判定に使うフィールド（表面・裏面）の内容のハッシュ"""
+    key = "\x1f".join((card.front, card.back))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+def _is_missing_note(error: Optional[str]) -> bool:
+    """updateNoteFieldsのエラーが「ノートが存在しない」ことによるものか"""
+    return "not found" in (error or "").lower()
+
+
+class NoteIdMap:
+    """
+    インポートしたカードのノートIDを保持するSQLiteのマッピング
+    - 内容が同じカード: 何も送らずに記録済みのノートIDを返す
+    - 内容（表面・裏面）が変わったカード: updateNoteFieldsで既存のノートを更新する
+    - 記録がないカード: 呼び出し側でaddNotesし、record_addedで記録する
+    タグの変更は比較しない。Anki側で削除されたノートは、更新時にノートが見つからないと返されたときだけ記録から外す
+    """
+
+    def __init__(self, path: str = DEFAULT_MAP_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS notes ("
+                " source_key BLOB PRIMARY KEY,"
+                " note_id INTEGER NOT NULL,"
+                " content_hash BLOB NOT NULL,"
+                " updated_at REAL NOT NULL) WITHOUT ROWID"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def lookup_many(self, keys: Iterable[bytes]) -> Dict[bytes, Tuple[int, bytes]]:
+        """記録済みのキーの (ノートID, 内容のハッシュ) を返す"""
+        keys = list(keys)
+        found: Dict[bytes, Tuple[int, bytes]] = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for key, note_id, digest in self._conn.execute(
+                    f"SELECT source_key, note_id, content_hash FROM notes WHERE source_key IN ({placeholders})",
+                    batch,
+                ):
+                    found[key] = (note_id, digest)
+        return found
+
+    def record_many(self, entries: Iterable[Tuple[bytes, int, bytes]]) -> None:
+        """(キー, ノートID, 内容のハッシュ) をまとめて記録（既存の記録は上書き）"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO notes (source_key, note_id, content_hash, updated_at) VALUES (?, ?, ?, ?)",
+                ((key, note_id, digest, now) for key, note_id, digest in entries),
+            )
+
+    def forget_many(self, keys: Iterable[bytes]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM notes WHERE source_key = ?", ((key,) for key in keys))
+
+    def record_added(self, cards: Sequence[Any], note_ids: Sequence[Optional[int]]) -> None:
+        """addNotesの結果（カードと同じ順のノートID）のうち、追加できたものを記録"""
+        self.record_many(
+            (source_key(card), note_id, content_hash(card))
+            for card, note_id in zip(cards, note_ids) if note_id
+        )
+
+    def reconcile(self, client, cards: Sequence[Any]) -> Tuple[List[Optional[int]], Set[int], Set[int]]:
+        """
+        記録済みのカードを処理し、(カードと同じ順のノートID, 更新したカードの添字, 更新に失敗したカードの添字) を返す
+        ノートIDがNoneのカードはまだAnkiにない（またはAnki側で削除されていた）ので、呼び出し側でaddNotesする
+        更新はmultiリクエストにまとめて送る（検索は行わない）
+        multi自体が送れなかった場合は、送れた分だけ記録して例外を送出する（失敗した分の記録は変えない）
+        """
+        keys = [source_key(card) for card in cards]
+        known = self.lookup_many(keys)
+        note_ids: List[Optional[int]] = [None] * len(cards)
+        if not known:
+            return note_ids, set(), set()
+
+        changes = []
+        with client.batch() as batch:
+            for index, (card, key) in enumerate(zip(cards, keys)):
+                if key not in known:
+                    continue
+                note_id, digest = known[key]
+                note_ids[index] = note_id
+                new_digest = content_hash(card)
+                if new_digest != digest:
+                    fields = {FRONT_FIELD: card.front, BACK_FIELD: card.back}
+                    pending = batch.add("updateNoteFields", {"note": {"id": note_id, "fields": fields}})
+                    changes.append((index, key, new_digest, pending))
+
+        updated: Set[int] = set()
+        failed: Set[int] = set()
+        recorded = []
+        forgotten = []
+        transport_error: Optional[str] = None
+        for index, key, digest, pending in changes:
+            if pending.ok:
+                updated.add(index)
+                recorded.append((key, note_ids[index], digest))
+            elif not pending.delivered:
+                # Ankiに届いていない（接続できないなど）。記録はそのまま残す
+                transport_error = pending.error
+            elif _is_missing_note(pending.error):
+                # Anki側で削除されたノート。記録から外して新しく追加し直す
+                print(f"⚠️  ノート {note_ids[index]} が見つからないため追加し直します")
+                forgotten.append(key)
+                note_ids[index] = None
+            else:
+                # 記録は古い内容のまま残し、次回のインポートで更新を再試行する
+                print(f"❌ ノート {note_ids[index]} の更新に失敗: {pending.error}")
+                failed.add(index)
+
+        if recorded:
+            self.record_many(recorded)
+        if forgotten:
+            self.forget_many(forgotten)
+        if transport_error is not None:
+            raise Exception(transport_error)
+        return note_ids, updated, failed
+
+    def clear(self) -> None:
+        """マッピングを空にする"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM notes")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
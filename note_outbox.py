@@ -0,0 +1,327 @@
+"""
+AnkiConnectに接続できないときに生成済みノートを溜めておくローカルの送信待ちキュー（アウトボックス）
+SQLite（WALモード）に即座に書き込み、接続が戻ったらバックグラウンドでaddNotesにまとめて送信する
+
+各ノートの状態:
+    PENDING   送信待ち
+    SENDING   addNotesで送信中
+    UNCERTAIN 送信したが結果が分からない（送信中のクラッシュ・タイムアウトなど）
+    FAILED    Ankiに拒否された（無効なノートなど。retry_failedで再送できる）
+送信に成功したノートはアウトボックスから削除する。UNCERTAINのノートは再送前に
+canAddNotesで確認し、追加できないものはfindNotes / notesInfoで同じノートがAnkiにあるかを確かめる。
+届いていたものは送らないため二重登録せず、届いていなかったもの（無効なノートなど）はFAILEDとして残す
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from anki_client import AnkiConnectClient
+
+DEFAULT_OUTBOX_PATH = os.path.join(".anki_cache", "outbox.sqlite3")
+
+PENDING = 0
+SENDING = 1
+UNCERTAIN = 2
+FAILED = 3
+
+_STATE_NAMES = {PENDING: "pending", SENDING: "sending", UNCERTAIN: "uncertain", FAILED: "failed"}
+
+
+def _note_from_card(card: Any) -> Dict[str, Any]:
+    """AnkiCard（StructuredCardを含む）・ノートの辞書をAnkiConnect形式のノートに変換"""
+    if isinstance(card, dict):
+        return card
+    return card.to_anki_format()
+
+
+def _quote_search(term: str) -> str:
+    """Ankiの検索語を引用符で囲む（" \\ * _ をエスケープ）"""
+    return '"' + re.sub(r'([\\"*_])', r'\\\1', term) + '"'
+
+
+def _note_query(note: Dict[str, Any]) -> str:
+    """ノートと同じデッキ・同じ先頭フィールドのノートを探す検索クエリ"""
+    query = _quote_search(f"deck:{note.get('deckName', '')}")
+    fields = note.get("fields") or {}
+    if fields:
+        name, value = next(iter(fields.items()))
+        query += " " + _quote_search(f"{name}:{value}")
+    return query
+
+
+class NoteOutbox:
+    """SQLite（WAL）に永続化する、クラッシュしても二重登録しないノートの送信待ちキュー"""
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH, client: Optional[AnkiConnectClient] = None,
+                 batch_size: int = 500, flush_interval: float = 5.0, max_backoff: float = 60.0):
+        if batch_size < 1:
+            raise ValueError("batch_size は1以上を指定してください")
+
+        self.path = path
+        self.client = client or AnkiConnectClient()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 送信処理は同時に1つだけ（バックグラウンドとflush()の呼び出しが重ならないように）
+        self._flush_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WALモードでは書き込みがfsyncを待たずに済み、プロセスが落ちてもコミット済みの行は失われない
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " note TEXT NOT NULL,"
+                " state INTEGER NOT NULL DEFAULT 0,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state, id)")
+            # 前回送信中のまま終了したノートは、Ankiに届いたか分からない
+            self._conn.execute("UPDATE outbox SET state = ? WHERE state = ?", (UNCERTAIN, SENDING))
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "NoteOutbox":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        """未送信（FAILED以外）のノート数"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE state != ?", (FAILED,)
+            ).fetchone()[0]
+
+    def enqueue(self, cards: Iterable[Any]) -> int:
+        """カード（またはノートの辞書）を1トランザクションで書き込み、件数を返す"""
+        now = time.time()
+        rows = [(json.dumps(_note_from_card(card), ensure_ascii=False), now) for card in cards]
+        if not rows:
+            return 0
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO outbox (note, created_at) VALUES (?, ?)", rows)
+
+        if self._thread is not None and len(rows) >= self.batch_size:
+            self._wake.set()
+        return len(rows)
+
+    def flush(self) -> int:
+        """
+        溜まっているノートをbatch_size件ずつaddNotesで送信し、追加できた件数を返す
+        接続できない場合は例外を送出する（ノートはアウトボックスに残る）
+        """
+        delivered = 0
+        with self._flush_lock:
+            while self._resolve_uncertain():
+                pass
+            while True:
+                rows = self._claim_batch()
+                if not rows:
+                    break
+                delivered += self._send_batch(rows)
+        return delivered
+
+    def _claim_batch(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """送信待ちのノートを古い順に取り出し、送信中にする"""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, note FROM outbox WHERE state = ? ORDER BY id LIMIT ?",
+                (PENDING, self.batch_size),
+            ).fetchall()
+            if not rows:
+                return []
+            self._conn.executemany(
+                "UPDATE outbox SET state = ?, attempts = attempts + 1 WHERE id = ?",
+                ((SENDING, row_id) for row_id, _ in rows),
+            )
+        return [(row_id, json.loads(note)) for row_id, note in rows]
+
+    def _send_batch(self, rows: List[Tuple[int, Dict[str, Any]]]) -> int:
+        notes = [note for _, note in rows]
+        try:
+            self._ensure_decks(set(note.get("deckName") for note in notes))
+        except Exception:
+            # まだ何も送っていないので送信待ちに戻す
+            self._set_state([row_id for row_id, _ in rows], PENDING)
+            raise
+
+        try:
+            note_ids = self.client._send_request("addNotes", {"notes": notes}).get("result") or []
+            if len(note_ids) != len(rows):
+                raise Exception(f"addNotesの結果数が一致しません ({len(note_ids)}/{len(rows)})")
+        except Exception:
+            # 一部だけ追加された可能性があるため、次回はcanAddNotesで確認してから再送する
+            self._set_state([row_id for row_id, _ in rows], UNCERTAIN)
+            raise
+
+        delivered = [row_id for (row_id, _), note_id in zip(rows, note_ids) if note_id]
+        rejected = [row_id for (row_id, _), note_id in zip(rows, note_ids) if not note_id]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", ((row_id,) for row_id in delivered))
+            self._conn.executemany(
+                "UPDATE outbox SET state = ?, last_error = ? WHERE id = ?",
+                ((FAILED, "重複または無効なノート", row_id) for row_id in rejected),
+            )
+
+        print(f"📤 アウトボックスから{len(delivered)}/{len(rows)}枚のカードを送信しました")
+        return len(delivered)
+
+    def _resolve_uncertain(self) -> bool:
+        """
+        送信結果が分からないノートをcanAddNotesで確認する
+        追加できるノートは送信待ちに戻す。追加できないノートは、同じ内容のノートがAnkiにあれば
+        送信済みとして削除し、なければ（無効なノート・別のノートとの重複）FAILEDにして残す
+        確認したノートがあればTrueを返す
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, note FROM outbox WHERE state = ? ORDER BY id LIMIT ?",
+                (UNCERTAIN, self.batch_size),
+            ).fetchall()
+        if not rows:
+            return False
+
+        notes = [json.loads(note) for _, note in rows]
+        self._ensure_decks(set(note.get("deckName") for note in notes))
+        can_add = self.client._send_request("canAddNotes", {"notes": notes}).get("result") or []
+        if len(can_add) != len(rows):
+            raise Exception(f"canAddNotesの結果数が一致しません ({len(can_add)}/{len(rows)})")
+
+        rejected = [(row_id, note) for (row_id, _), note, ok in zip(rows, notes, can_add) if not ok]
+        found = self._find_delivered([note for _, note in rejected])
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM outbox WHERE id = ?",
+                ((row_id,) for (row_id, _), delivered in zip(rejected, found) if delivered),
+            )
+            self._conn.executemany(
+                "UPDATE outbox SET state = ?, last_error = ? WHERE id = ?",
+                ((FAILED, "追加できないノート（無効なノートまたは別のノートとの重複）", row_id)
+                 for (row_id, _), delivered in zip(rejected, found) if not delivered),
+            )
+            self._conn.executemany(
+                "UPDATE outbox SET state = ? WHERE id = ?",
+                ((PENDING, row_id) for (row_id, _), ok in zip(rows, can_add) if ok),
+            )
+        return True
+
+    def _find_delivered(self, notes: List[Dict[str, Any]]) -> List[bool]:
+        """
+        各ノートと同じ内容（ノートタイプ・全フィールド）のノートがAnkiにあるか
+        findNotesはmultiリクエスト1回にまとめ、候補はnotesInfoで照合する
+        確認できなかった場合は例外を送出する（ノートは送信結果不明のまま残る）
+        """
+        if not notes:
+            return []
+
+        with self.client.batch() as batch:
+            searches = [batch.add("findNotes", {"query": _note_query(note)}) for note in notes]
+        candidates = [pending.result() or [] for pending in searches]
+
+        note_ids = list(dict.fromkeys(note_id for ids in candidates for note_id in ids))
+        contents: Dict[int, Tuple[Any, Dict[str, Any]]] = {}
+        for start in range(0, len(note_ids), self.batch_size):
+            infos = self.client._send_request(
+                "notesInfo", {"notes": note_ids[start:start + self.batch_size]}
+            ).get("result") or []
+            for info in infos:
+                if info and "noteId" in info:
+                    fields = {name: field.get("value") for name, field in info.get("fields", {}).items()}
+                    contents[info["noteId"]] = (info.get("modelName"), fields)
+
+        return [
+            any(contents.get(note_id) == (note.get("modelName"), note.get("fields")) for note_id in ids)
+            for note, ids in zip(notes, candidates)
+        ]
+
+    def _ensure_decks(self, deck_names: Iterable[str]) -> None:
+        """送信するノートのデッキが存在しなければmultiリクエスト1回でまとめて作成"""
+        missing = [name for name in deck_names if name and not self.client.has_deck(name)]
+        if not missing:
+            return
+        with self.client.batch() as batch:
+            for deck_name in missing:
+                batch.add("createDeck", {"deck": deck_name})
+
+    def _set_state(self, row_ids: List[int], state: int) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE outbox SET state = ? WHERE id = ?", ((state, row_id) for row_id in row_ids)
+            )
+
+    def retry_failed(self) -> int:
+        """Ankiに拒否されたノートを送信待ちに戻す"""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE outbox SET state = ?, last_error = NULL WHERE state = ?", (PENDING, FAILED)
+            ).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """状態ごとのノート数"""
+        counts = {name: 0 for name in _STATE_NAMES.values()}
+        with self._lock:
+            for state, count in self._conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state"):
+                counts[_STATE_NAMES.get(state, str(state))] = count
+        return counts
+
+    def start(self) -> "NoteOutbox":
+        """バックグラウンドで定期的にflushするスレッドを開始"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="anki-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        delay = self.flush_interval
+        while not self._stop.is_set():
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if len(self) == 0:
+                continue
+            try:
+                self.flush()
+                delay = self.flush_interval
+            except Exception:
+                # Ankiが起動するまで待ち時間を延ばしながら再試行する
+                delay = min(max(delay, 0.5) * 2, self.max_backoff)
+
+    def stop(self, flush: bool = True, timeout: Optional[float] = None) -> None:
+        """バックグラウンドのスレッドを停止（flush=Trueなら最後に一度送信を試みる）"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+        if flush and len(self) > 0:
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️  アウトボックスに{len(self)}枚のカードが残っています: {e}")
+
+    def close(self) -> None:
+        self.stop()
+        with self._lock:
+            self._conn.close()
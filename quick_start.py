@@ -6,7 +6,6 @@ Anki学習システム クイックスタート
 
 import sys
 import os
-from llm_interface import LearningSession
 
 def check_anki_connection():
     """Anki接続チェック"""
@@ -71,6 +70,7 @@ def quick_learning():
     print(f"\n📚 デッキ '{deck_name}' で学習を開始します")
     
     # 学習セッション開始
+    from llm_interface import LearningSession
     session = LearningSession(deck_name)
     
     print("\n💡 使い方のコツ:")
@@ -117,6 +117,7 @@ def demo_mode():
         scenario = demo_scenarios[0]
     
     # デモ実行
+    from llm_interface import LearningSession
     session = LearningSession("デモ学習")
     print(f"\n📚 質問: {scenario['question']}")
     
@@ -4,9 +4,10 @@
 LLMの出力を直接Ankiに登録するための最短パス
 """
 
-from direct_card_importer import DirectCardImporter
+import os
 
-def import_to_anki(data: str, deck_name: str = "LLM学習", format_type: str = "auto") -> dict:
+def import_to_anki(data: str, deck_name: str = "LLM学習", format_type: str = "auto",
+                   skip_duplicates: bool = False, daemon_url: str = None) -> dict:
     """
     データを直接Ankiにインポートする最短関数
     
@@ -14,12 +15,37 @@ def import_to_anki(data: str, deck_name: str = "LLM学習", format_type: str = "
         data: インポートするデータ（テキストまたはJSON）
         deck_name: Ankiデッキ名
         format_type: "auto", "table", "json"
+        skip_duplicates: Trueの場合、ローカルの重複インデックスで既知の重複を送信前に除外
+        daemon_url: インポートデーモン（import_daemon.py）のURL。省略時は環境変数
+            ANKI_IMPORT_DAEMON_URL。指定されていればデーモンに送るだけのシンクライアントとして動き、
+            デーモンが起動していない（接続できない）場合だけ直接インポートする
     
     Returns:
         インポート結果の辞書
     """
+    daemon_url = daemon_url or os.environ.get("ANKI_IMPORT_DAEMON_URL")
+    if daemon_url:
+        from import_daemon import is_daemon_unreachable, submit_import
+        try:
+            return submit_import(data, deck_name, format_type, skip_duplicates, daemon_url)
+        except OSError as e:
+            if not is_daemon_unreachable(e):
+                # 送信後のタイムアウトなど。デーモンが処理を続けている可能性があるので、二重に登録しないよう
+                # 直接インポートし直さない
+                in_progress = isinstance(e, TimeoutError)
+                message = "デーモンの応答待ちがタイムアウトしました（インポートは処理中の可能性があります）" \
+                    if in_progress else f"インポートデーモンとの通信に失敗しました: {e}"
+                return {"success": False, "in_progress": in_progress, "error": message}
+            print(f"⚠️  インポートデーモンに接続できないため直接インポートします: {e}")
+    
+    from direct_card_importer import DirectCardImporter
+    
     try:
-        importer = DirectCardImporter(deck_name)
+        duplicate_index = None
+        if skip_duplicates:
+            from duplicate_index import DuplicateIndex
+            duplicate_index = DuplicateIndex()
+        importer = DirectCardImporter(deck_name, duplicate_index=duplicate_index)
         result = importer.import_from_text(data, deck_name, format_type)
         return result
     except Exception as e:
@@ -37,29 +63,17 @@ def quick_import(front_back_pairs: list, deck_name: str = "クイック学習",
     Returns:
         インポート結果
     """
-    from anki_schema import AnkiCard
+    from anki_schema import AnkiCard, intern_tags
+    from direct_card_importer import DirectCardImporter
     
     try:
         importer = DirectCardImporter(deck_name)
-        cards = []
-        
-        for front, back in front_back_pairs:
-            card = AnkiCard(
-                front=str(front),
-                back=str(back),
-                deck_name=deck_name,
-                tags=tags or []
-            )
-            
-            # StructuredCardに変換
-            from direct_card_importer import StructuredCard
-            structured_card = StructuredCard(
-                front=card.front,
-                back=card.back,
-                tags=card.tags,
-                deck_name=card.deck_name
-            )
-            cards.append(structured_card)
+        # 全カードで同じタグのタプルを共有し、AnkiCardをそのままインポートする
+        shared_tags = intern_tags(tags or [])
+        cards = [
+            AnkiCard(front=str(front), back=str(back), deck_name=deck_name, tags=shared_tags)
+            for front, back in front_back_pairs
+        ]
         
         return importer.import_cards(cards)
         
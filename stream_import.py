@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+巨大なJSONL / JSON配列ファイルをメモリ一定でAnkiにインポートするスクリプト
+
+使い方:
+    python3 stream_import.py cards.jsonl --deck 英単語
+    cat cards.jsonl | python3 stream_import.py - --deck 英単語
+    python3 stream_import.py cards.jsonl --deck 英単語 --resume   # 中断したインポートを続きから再開
+"""
+
+import argparse
+import sys
+
+from direct_card_importer import DirectCardImporter
+
+
+def stream_import(path: str, deck_name: str = "構造化学習", chunk_size: int = 500, resume: bool = False) -> dict:
+    """
+    ファイル（'-'なら標準入力）を逐次読み込んでインポート
+    ファイルの場合は進捗をチェックポイントに記録し、resume=Trueなら続きから再開する
+    """
+    try:
+        importer = DirectCardImporter(deck_name)
+        if path == "-":
+            return importer.import_json_stream(sys.stdin, deck_name, chunk_size)
+        return importer.import_from_file(path, deck_name, "json", resume=resume, chunk_size=chunk_size)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSONL / JSON配列のストリーミングインポート")
+    parser.add_argument("path", help="入力ファイル（'-'で標準入力）")
+    parser.add_argument("--deck", default="構造化学習", help="デッキ名")
+    parser.add_argument("--chunk-size", type=int, default=500, help="addNotes 1回あたりのカード数")
+    parser.add_argument("--resume", action="store_true", help="前回中断した位置から再開する")
+    args = parser.parse_args()
+
+    result = stream_import(args.path, args.deck, args.chunk_size, args.resume)
+
+    if result.get("success"):
+        print(f"\n📊 インポート結果:")
+        print(f"   総カード数: {result['total_cards']}")
+        print(f"   成功: {result['successful']}")
+        print(f"   失敗: {result['failed']}")
+    else:
+        print(f"❌ インポートに失敗しました: {result.get('error') or result.get('message')}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()